@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark slacker.utils.stringutils.AhoCorasick against looping over the
+patterns with ``in`` and against a compiled regex alternation, for str and
+bytes texts.
+
+Run from the root of the repository:
+
+    python benchmarks/bench_aho_corasick.py [--patterns N] [--text-size N]
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import slacker libs
+from slacker.utils.stringutils import AhoCorasick  # pylint: disable=wrong-import-position
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--patterns', type=int, default=500)
+    parser.add_argument('--text-size', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    rand = random.Random(0)
+    alphabet = string.ascii_lowercase
+    patterns = [
+        ''.join(rand.choice(alphabet) for _ in range(rand.randint(8, 16)))
+        for _ in range(args.patterns)
+    ]
+    # Random patterns of 8+ letters practically never occur in the text, so
+    # every approach has to scan all of it
+    text = ''.join(rand.choice(alphabet + ' ') for _ in range(args.text_size))
+
+    print('{0} patterns, {1} characters of text'.format(
+        args.patterns, args.text_size))
+    for kind, pats, txt in (
+            ('str', patterns, text),
+            ('bytes', [x.encode('ascii') for x in patterns],
+             text.encode('ascii'))):
+        automaton = AhoCorasick.compile(pats)
+        regex = re.compile(b'|'.join(re.escape(x) for x in pats)
+                           if kind == 'bytes' else
+                           '|'.join(re.escape(x) for x in pats))
+        candidates = (
+            ('loop over in', lambda: any(x in txt for x in pats)),
+            ('regex alternation', lambda: regex.search(txt) is not None),
+            ('AhoCorasick', lambda: automaton.contains_any(txt)),
+        )
+        expected = candidates[0][1]()
+        for name, func in candidates:
+            if func() != expected:
+                raise SystemExit('{0} disagrees'.format(name))
+            best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+            print('{0:>6} {1:>18}: {2:10.3f} ms'.format(kind, name, best * 1000))
+        build = min(timeit.repeat(lambda: AhoCorasick(pats), number=1,
+                                  repeat=args.repeat))
+        print('{0:>6} {1:>18}: {2:10.3f} ms'.format(kind, 'AhoCorasick build',
+                                                  build * 1000))
+
+
+if __name__ == '__main__':
+    main()
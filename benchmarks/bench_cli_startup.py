@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark the startup cost of slacker.utils.parsers CLI parsers: a fresh
+interpreter importing the module and creating a parser class with mix-ins,
+and in-process, the class creation and the per-parse lookup of the
+process_<option> functions against the dir() scan and per-parse sort the
+parsers used before the tables were built once per class.
+
+Run from the root of the repository:
+
+    python benchmarks/bench_cli_startup.py [--mixins N] [--options N] [--runs N]
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import argparse
+import os
+import subprocess
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Import slacker libs
+from slacker.ext import six  # pylint: disable=wrong-import-position
+from slacker.utils import parsers  # pylint: disable=wrong-import-position
+
+_STARTUP_CODE = '''
+import sys
+sys.path.insert(0, {root!r})
+sys.argv = ['bench_cli_startup']
+from benchmarks.bench_cli_startup import make_parser_class
+make_parser_class({mixins}, {options})
+'''
+
+
+class LegacyOptionParserMeta(parsers.MixInMeta):
+    '''
+    The class creation of OptionParserMeta before the mix-in tables were
+    precomputed: a dir() scan of every base tagging the process_<option>
+    functions with their priority
+    '''
+    def __new__(mcs, name, bases, attrs):
+        instance = super(LegacyOptionParserMeta, mcs).__new__(mcs, name,
+                                                              bases, attrs)
+        instance._mixin_setup_funcs = []
+        for base in parsers._sorted(bases + (instance,)):
+            func = getattr(base, '_mixin_setup', None)
+            if func is not None and func not in instance._mixin_setup_funcs:
+                instance._mixin_setup_funcs.append(func)
+            for attr in dir(base):
+                if not attr.startswith('process_'):
+                    continue
+                func = getattr(base, attr)
+                if getattr(func, '_mixin_prio_', None) is not None:
+                    continue
+                func = getattr(func, '__func__', func)
+                func._mixin_prio_ = getattr(base, '_mixin_prio_', 1000)
+        return instance
+
+
+def legacy_process_funcs(parser, options):
+    '''
+    Gather and sort the process_<option> functions the way every parse did
+    before the tables were precomputed
+    '''
+    funcs = []
+    for option_key in options.__dict__:
+        func = getattr(parser, 'process_{0}'.format(option_key), None)
+        if func is not None:
+            funcs.append(func)
+    return parsers._sorted(funcs)
+
+
+def process_funcs(parser, options):
+    '''
+    Gather the process_<option> functions from the precomputed table
+    '''
+    return [getattr(parser, func_name)
+            for option_key, func_name in parser._mixin_process_funcs
+            if option_key in options.__dict__]
+
+
+def make_mixins(metaclass, mixins, options):
+    '''
+    Create ``mixins`` mix-in classes with ``options`` process_<option>
+    functions each
+    '''
+    ret = []
+    for idx in range(mixins):
+        attrs = {
+            '_mixin_prio_': idx * 10,
+            '_mixin_setup': lambda self: None,
+        }
+        for opt in range(options):
+            func_name = 'process_mixin{0}_opt{1}'.format(idx, opt)
+            attrs[func_name] = lambda self: None
+            attrs[func_name].__name__ = str(func_name)
+        ret.append(metaclass(str('MixIn{0}'.format(idx)), (object,), attrs))
+    return ret
+
+
+def make_parser_class(mixins, options, metaclass=parsers.OptionParserMeta):
+    '''
+    Create a parser class the way slacker CLIs define theirs, with
+    ``mixins`` either a number of mix-ins to create or the mix-ins
+    '''
+    if isinstance(mixins, six.integer_types):
+        mixins = make_mixins(parsers.MixInMeta, mixins, options)
+    return metaclass(str('BenchParser'),
+                     (parsers.OptionParser,) + tuple(mixins), {})
+
+
+def startup(mixins, options, runs):
+    '''
+    Return the wall-clock times of ``runs`` fresh interpreters importing
+    slacker.utils.parsers and creating a parser class
+    '''
+    code = _STARTUP_CODE.format(root=ROOT, mixins=mixins, options=options)
+    times = []
+    for _ in range(runs):
+        start = timeit.default_timer()
+        subprocess.check_call([sys.executable, '-c', code], cwd=ROOT)
+        times.append(timeit.default_timer() - start)
+    return sorted(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--mixins', type=int, default=20,
+                        help='Mix-in classes of the parser')
+    parser.add_argument('--options', type=int, default=5,
+                        help='process_<option> functions of each mix-in')
+    parser.add_argument('--runs', type=int, default=20,
+                        help='Fresh interpreter runs')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print('{0} mix-ins with {1} process_<option> functions each'.format(
+        args.mixins, args.options))
+    times = startup(args.mixins, args.options, args.runs)
+    print('{0:>34}: {1:10.3f} ms (median), {2:.3f} ms (min)'.format(
+        'interpreter startup', times[len(times) // 2] * 1000, times[0] * 1000))
+
+    mixins = make_mixins(parsers.MixInMeta, args.mixins, args.options)
+    for name, metaclass in (('dir() scan', LegacyOptionParserMeta),
+                            ('precomputed tables', parsers.OptionParserMeta)):
+        best = min(timeit.repeat(
+            lambda: make_parser_class(mixins, args.options, metaclass),
+            number=10, repeat=args.repeat)) / 10
+        print('{0:>34}: {1:10.3f} ms'.format(
+            'class creation, ' + name, best * 1000))
+
+    # OptionParser.__init__ doesn't set up optparse, so the lookups run on
+    # a bare instance with options set for every process_<option> function
+    cls = make_parser_class(args.mixins, args.options)
+    instance = object.__new__(cls)
+    options = argparse.Namespace(**dict(
+        (func_name[len('process_'):], None)
+        for func_name in dir(cls) if func_name.startswith('process_')
+    ))
+    legacy_cls = make_parser_class(args.mixins, args.options,
+                                   LegacyOptionParserMeta)
+    legacy_instance = object.__new__(legacy_cls)
+    if [x.__name__ for x in legacy_process_funcs(legacy_instance, options)] \
+            != [x.__name__ for x in process_funcs(instance, options)]:
+        raise SystemExit('Process function orders differ')
+    for name, func in (
+            ('dir() scan', lambda: legacy_process_funcs(legacy_instance,
+                                                        options)),
+            ('precomputed tables', lambda: process_funcs(instance, options))):
+        best = min(timeit.repeat(func, number=1000,
+                                 repeat=args.repeat)) / 1000
+        print('{0:>34}: {1:10.3f} us'.format('process lookup, ' + name,
+                                             best * 1000000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark slacker.utils.dictupdate.merge_all against the naive approach of
+deep copying the first layer and recursively updating it with the others.
+
+Run from the root of the repository:
+
+    python benchmarks/bench_dictupdate.py [--layers N] [--keys N] [--depth N]
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import argparse
+import copy
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import slacker libs
+import slacker.utils.dictupdate  # pylint: disable=wrong-import-position
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+def make_tree(rand, keys, depth):
+    '''
+    Build a nested dict with ``keys`` keys per level, ``depth`` levels deep
+    '''
+    if depth == 0:
+        return rand.randint(0, 1000)
+    return dict(
+        ('key{0}'.format(idx), make_tree(rand, keys, depth - 1))
+        for idx in range(keys)
+    )
+
+
+def make_layer(rand, base, changes):
+    '''
+    Build a layer overriding ``changes`` random leaves of ``base``
+    '''
+    layer = {}
+    for _ in range(changes):
+        src, dst = base, layer
+        while True:
+            key = rand.choice(list(src))
+            if not isinstance(src[key], Mapping):
+                dst[key] = rand.randint(0, 1000)
+                break
+            src = src[key]
+            dst = dst.setdefault(key, {})
+    return layer
+
+
+def naive_update(dest, upd):
+    for key, value in upd.items():
+        if isinstance(value, Mapping) and isinstance(dest.get(key), Mapping):
+            naive_update(dest[key], value)
+        else:
+            dest[key] = copy.deepcopy(value)
+    return dest
+
+
+def naive_merge_all(layers):
+    ret = copy.deepcopy(layers[0])
+    for layer in layers[1:]:
+        naive_update(ret, layer)
+    return ret
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--layers', type=int, default=8)
+    parser.add_argument('--keys', type=int, default=10)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--changes', type=int, default=20,
+                        help='Leaves overridden by each layer')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    rand = random.Random(0)
+    base = make_tree(rand, args.keys, args.depth)
+    layers = [base] + [make_layer(rand, base, args.changes)
+                       for _ in range(args.layers - 1)]
+    if naive_merge_all(layers) != slacker.utils.dictupdate.merge_all(layers):
+        raise SystemExit('Results differ')
+
+    print('{0} layers over a tree of {1} leaves'.format(
+        args.layers, args.keys ** args.depth))
+    for name, func in (
+            ('copy.deepcopy + update', naive_merge_all),
+            ('dictupdate.merge_all', slacker.utils.dictupdate.merge_all)):
+        best = min(timeit.repeat(lambda: func(layers), number=1,
+                                 repeat=args.repeat))
+        print('{0:>24}: {1:10.3f} ms'.format(name, best * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark the memory per entry of slacker.utils.odict.CompactOrderedDict
+against collections.OrderedDict, and the time of its snapshot copies and
+move_to_end.
+
+Run from the root of the repository:
+
+    python benchmarks/bench_odict.py [--entries N]
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import argparse
+import collections
+import gc
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import slacker libs
+from slacker.utils.odict import CompactOrderedDict  # pylint: disable=wrong-import-position
+
+
+def measure(cls, keys):
+    '''
+    Return the number of bytes allocated to store ``keys`` in a ``cls``,
+    not counting the keys and values themselves
+    '''
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        mapping = cls()
+        for key in keys:
+            mapping[key] = None
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return after - before, mapping
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--entries', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    keys = ['key{0}'.format(idx) for idx in range(args.entries)]
+    print('{0} entries'.format(args.entries))
+    print('{0:>20} {1:>14} {2:>12} {3:>16}'.format(
+        '', 'bytes/entry', 'copy (ms)', 'move_to_end (us)'))
+    for cls in (collections.OrderedDict, CompactOrderedDict):
+        size, mapping = measure(cls, keys)
+        copy_time = min(timeit.repeat(mapping.copy, number=1,
+                                      repeat=args.repeat))
+        first = keys[0]
+        move_time = min(timeit.repeat(
+            lambda mapping=mapping: mapping.move_to_end(first), number=1000,
+            repeat=args.repeat)) / 1000
+        print('{0:>20} {1:14.1f} {2:12.3f} {3:16.3f}'.format(
+            cls.__name__, float(size) / args.entries, copy_time * 1000,
+            move_time * 1000000))
+        del mapping
+
+
+if __name__ == '__main__':
+    main()
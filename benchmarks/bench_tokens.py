@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark the throughput of slacker.utils.stringutils.TokenGenerator
+against drawing from os.urandom and base64-encoding for every token, the
+way stringutils.random used to.
+
+Run from the root of the repository:
+
+    python benchmarks/bench_tokens.py [--count N] [--size N]
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import argparse
+import base64
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Import slacker libs
+from slacker.utils.stringutils import TokenGenerator  # pylint: disable=wrong-import-position
+
+
+def urandom_token(size):
+    return base64.b64encode(os.urandom(size)).replace(b'\n', b'')[:size] \
+        .decode('ascii')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--size', type=int, default=32)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    count, size = args.count, args.size
+    candidates = [
+        ('os.urandom per token',
+         lambda: [urandom_token(size) for _ in range(count)]),
+    ]
+    for alphabet in ('base64', 'urlsafe', 'hex'):
+        generator = TokenGenerator(alphabet)
+        candidates.append((
+            '{0} token()'.format(alphabet),
+            lambda gen=generator: [gen.token(size) for _ in range(count)],
+        ))
+        candidates.append((
+            '{0} tokens()'.format(alphabet),
+            lambda gen=generator: gen.tokens(count, size),
+        ))
+
+    print('{0} tokens of {1} characters'.format(count, size))
+    for name, func in candidates:
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        print('{0:>22}: {1:12.0f} tokens/s'.format(name, count / best))
+
+
+if __name__ == '__main__':
+    main()
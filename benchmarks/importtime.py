@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+'''
+Report the import time of every slacker module.
+
+Each module is imported in a fresh interpreter run with ``-X importtime``
+and the output is parsed into a table of the time spent importing the
+module itself and everything it pulled in, sorted from the slowest. The
+modules each of them spends the most time importing are listed too.
+
+Run from the root of the repository:
+
+    python benchmarks/importtime.py [--repeat N] [--top N] [--json] [module ...]
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORTTIME_RE = re.compile(
+    r'^import time:\s+(?P<self>\d+)\s+\|\s+(?P<cumulative>\d+)\s+\|'
+    r'(?P<indent>\s*)(?P<name>\S+)\s*$'
+)
+
+
+def find_modules(package='slacker'):
+    '''
+    Return the names of the modules of ``package`` found on disk, without
+    importing them
+    '''
+    ret = []
+    base = os.path.join(ROOT, package)
+    for dirpath, dirnames, filenames in os.walk(base):
+        dirnames[:] = sorted(x for x in dirnames if x != '__pycache__')
+        if '__init__.py' not in filenames:
+            dirnames[:] = []
+            continue
+        prefix = os.path.relpath(dirpath, ROOT).replace(os.sep, '.')
+        for filename in sorted(filenames):
+            if not filename.endswith('.py'):
+                continue
+            if filename == '__init__.py':
+                ret.append(prefix)
+            else:
+                ret.append('{0}.{1}'.format(prefix, filename[:-3]))
+    return ret
+
+
+def parse_importtime(output):
+    '''
+    Parse the ``-X importtime`` output into a list of ``(name, self_us,
+    cumulative_us, depth)`` tuples, in the order they were printed
+    '''
+    ret = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match is None:
+            continue
+        ret.append((
+            match.group('name'),
+            int(match.group('self')),
+            int(match.group('cumulative')),
+            len(match.group('indent')) // 2,
+        ))
+    return ret
+
+
+def measure(module):
+    '''
+    Import ``module`` in a new interpreter and return the parsed import
+    times, or the error message if the import failed
+    '''
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT] + [x for x in [env.get('PYTHONPATH')] if x]
+    )
+    proc = subprocess.Popen(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=ROOT, env=env,
+    )
+    stderr = proc.communicate()[1].decode('utf-8', 'replace')
+    if proc.returncode:
+        return stderr.strip().splitlines()[-1]
+    return parse_importtime(stderr)
+
+
+def report(module, repeat, top):
+    '''
+    Return the import times of ``module``, keeping the fastest of
+    ``repeat`` runs
+    '''
+    best = None
+    for _ in range(repeat):
+        times = measure(module)
+        if not isinstance(times, list):
+            return {'module': module, 'error': times}
+        total = [x for x in times if x[0] == module and x[3] == 0][-1][2]
+        if best is None or total < best[0]:
+            best = (total, times)
+    total, times = best
+    # The module's own line comes after the lines of everything it imported,
+    # which start after the previous top-level line (interpreter startup)
+    end = max(idx for idx, x in enumerate(times)
+              if x[0] == module and x[3] == 0)
+    start = max([idx + 1 for idx, x in enumerate(times[:end]) if x[3] == 0]
+                or [0])
+    tree = times[start:end]
+    heaviest = sorted(tree, key=lambda x: x[2], reverse=True)[:top]
+    return {
+        'module': module,
+        'cumulative_us': total,
+        'self_us': times[end][1],
+        'imported': len(tree) + 1,
+        'heaviest': [
+            {'module': name, 'cumulative_us': cumulative}
+            for name, _, cumulative, _ in heaviest
+        ],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('modules', nargs='*',
+                        help='Modules to measure, all slacker modules by default')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per module, the fastest is reported')
+    parser.add_argument('--top', type=int, default=3,
+                        help='Slowest imports listed for each module')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the report as JSON')
+    args = parser.parse_args(argv)
+
+    results = [report(module, args.repeat, args.top)
+               for module in args.modules or find_modules()]
+    results.sort(key=lambda x: x.get('cumulative_us', -1), reverse=True)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    width = max(len(x['module']) for x in results)
+    print('{0:<{w}} {1:>10} {2:>10} {3:>8}  {4}'.format(
+        'module', 'total ms', 'self ms', 'imports', 'slowest imports',
+        w=width))
+    for result in results:
+        if 'error' in result:
+            print('{0:<{w}} failed: {1}'.format(
+                result['module'], result['error'], w=width))
+            continue
+        print('{0:<{w}} {1:10.1f} {2:10.1f} {3:8d}  {4}'.format(
+            result['module'],
+            result['cumulative_us'] / 1000.0,
+            result['self_us'] / 1000.0,
+            result['imported'],
+            ', '.join('{0} ({1:.1f})'.format(x['module'],
+                                             x['cumulative_us'] / 1000.0)
+                      for x in result['heaviest']),
+            w=width))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+'''
+asyncio variants of the helpers in slacker.utils.process
+
+This module requires Python 3.
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import asyncio
+import logging
+import subprocess
+
+# Import slacker libs
+from slacker.utils.process import (
+    COMMAND_CHUNK_SIZE,
+    COMMAND_CONCURRENCY,
+    CommandRunner,
+)
+
+log = logging.getLogger(__name__)
+
+
+class AsyncCommandRunner(object):
+    '''
+    asyncio version of ``slacker.utils.process.CommandRunner``, running at
+    most ``max_concurrency`` commands at the same time
+    '''
+    def __init__(self, max_concurrency=COMMAND_CONCURRENCY, timeout=None,
+                 chunk_size=COMMAND_CHUNK_SIZE):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self._semaphore = None
+
+    def _get_semaphore(self):
+        # Created lazily so it belongs to the running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def stream(self, cmd, callback, timeout=None, lines=True, env=None,
+                     cwd=None):
+        '''
+        Run ``cmd`` and call ``callback(name, data)`` for every line (or
+        chunk if ``lines`` is False) of output, ``name`` being ``stdout`` or
+        ``stderr``. Returns the return code of the command.
+
+        If the command runs longer than ``timeout`` seconds it is killed
+        and ``subprocess.TimeoutExpired`` raised.
+        '''
+        if timeout is None:
+            timeout = self.timeout
+        async with self._get_semaphore():
+            proc = await asyncio.create_subprocess_exec(
+                *CommandRunner._resolve(cmd),  # pylint: disable=protected-access
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env=env,
+                cwd=cwd
+            )
+
+            async def _read(name, pipe):
+                # Lines are split out of fixed size chunks like in
+                # CommandRunner, StreamReader.readline() would fail on lines
+                # longer than the stream buffer limit
+                pending = []
+                while True:
+                    data = await pipe.read(self.chunk_size)
+                    if not data:
+                        if pending:
+                            callback(name, b''.join(pending))
+                        return
+                    if not lines:
+                        callback(name, data)
+                        continue
+                    parts = data.split(b'\n')
+                    if len(parts) > 1:
+                        pending.append(parts[0])
+                        callback(name, b''.join(pending) + b'\n')
+                        pending = []
+                        for part in parts[1:-1]:
+                            callback(name, part + b'\n')
+                    if parts[-1]:
+                        pending.append(parts[-1])
+
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(
+                        _read('stdout', proc.stdout),
+                        _read('stderr', proc.stderr),
+                        proc.wait(),
+                    ),
+                    timeout,
+                )
+            except asyncio.TimeoutError:
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            finally:
+                if proc.returncode is None:
+                    proc.kill()
+                    # Always reap the child
+                    await proc.wait()
+            return proc.returncode
+
+    async def run(self, cmd, timeout=None, env=None, cwd=None):
+        '''
+        Run ``cmd`` and return a ``(returncode, stdout, stderr)`` tuple
+        '''
+        out = {'stdout': [], 'stderr': []}
+        returncode = await self.stream(
+            cmd, lambda name, data: out[name].append(data),
+            timeout, lines=False, env=env, cwd=cwd
+        )
+        return returncode, b''.join(out['stdout']), b''.join(out['stderr'])
@@ -10,16 +10,29 @@ import copy
 import fnmatch
 import logging
 import re
+import threading
+import unicodedata
+import weakref
 
-import salt.utils.stringutils
+try:
+    from collections.abc import Mapping, Sequence
+except ImportError:
+    from collections import Mapping, Sequence
 
-from salt.utils.decorators.jinja import jinja_filter
+import slacker.utils.stringutils
 
+from slacker.utils.decorators import bounded_memoize
+from slacker.utils.decorators.jinja import jinja_filter
+
+from slacker.defaults import DEFAULT_TARGET_DELIM
 from slacker.ext import six
-from slacker.ext.six.moves import range
+from slacker.ext.six.moves import range, zip
 
 log = logging.getLogger(__name__)
 
+# Number of queries cached by PathQuery.compile()
+PATH_QUERY_CACHE_SIZE = 1024
+
 
 def decode_dict(data, encoding=None, errors='strict', keep=False,
                 normalize=False, preserve_dict_class=False,
@@ -28,9 +41,9 @@ def decode_dict(data, encoding=None, errors='strict', keep=False,
     Decode all string values to Unicode. Optionally use to_str=True to ensure
     strings are str types and not unicode in Python 2
     '''
-    _decode_func = salt.utils.stringutils.to_unicode \
+    _decode_func = slacker.utils.stringutils.to_unicode \
         if not to_str \
-        else salt.utils.stringutils.to_str
+        else slacker.utils.stringutils.to_str
     rv = data.__class__() if preserve_dict_class else {}
     for key, value in six.iteritems(data):
         if isinstance(key, tuple):
@@ -80,9 +93,9 @@ def decode_list(data, encoding=None, errors='strict', keep=False,
     Decode all string values to unicode. Optionally use to_str=True to ensure
     strings are str types and not unicode in Python 2
     '''
-    _decode_func = salt.utils.stringutils.to_unicode \
+    _decode_func = slacker.utils.stringutils.to_unicode \
         if not to_str \
-        else salt.utils.stringutils.to_str
+        else slacker.utils.stringutils.to_str
     rv = []
     for item in data:
         if isinstance(item, list):
@@ -143,7 +156,7 @@ def encode(data, encoding=None, errors='strict', keep=False,
                             preserve_dict_class, preserve_tuples)
     else:
         try:
-            return salt.utils.stringutils.to_bytes(data, encoding, errors)
+            return slacker.utils.stringutils.to_bytes(data, encoding, errors)
         except TypeError:
             pass
         except UnicodeEncodeError:
@@ -168,7 +181,7 @@ def encode_dict(data, encoding=None, errors='strict', keep=False,
                                 preserve_dict_class, preserve_tuples)
         else:
             try:
-                key = salt.utils.stringutils.to_bytes(key, encoding, errors)
+                key = slacker.utils.stringutils.to_bytes(key, encoding, errors)
             except TypeError:
                 pass
             except UnicodeEncodeError:
@@ -188,7 +201,7 @@ def encode_dict(data, encoding=None, errors='strict', keep=False,
                                 preserve_dict_class, preserve_tuples)
         else:
             try:
-                value = salt.utils.stringutils.to_bytes(value, encoding, errors)
+                value = slacker.utils.stringutils.to_bytes(value, encoding, errors)
             except TypeError:
                 pass
             except UnicodeEncodeError:
@@ -221,7 +234,7 @@ def encode_list(data, encoding=None, errors='strict', keep=False,
                                preserve_dict_class, preserve_tuples)
         else:
             try:
-                item = salt.utils.stringutils.to_bytes(item, encoding, errors)
+                item = slacker.utils.stringutils.to_bytes(item, encoding, errors)
             except TypeError:
                 pass
             except UnicodeEncodeError:
@@ -238,4 +251,646 @@ def encode_tuple(data, encoding=None, errors='strict', keep=False,
     Encode all string values to Unicode
     '''
     return tuple(
-        encode_list(data, encoding, errors, keep, preserve_dict_class, True))
\ No newline at end of file
+        encode_list(data, encoding, errors, keep, preserve_dict_class, True))
+
+
+def _traverse_parts(data, parts, default=None):
+    '''
+    Walk ``data`` following the already split path ``parts``. See
+    ``traverse_dict_and_list`` for the lookup rules.
+    '''
+    ptr = data
+    for each in parts:
+        if isinstance(ptr, list):
+            try:
+                idx = int(each)
+            except ValueError:
+                embed_match = False
+                # Look for the key in any dicts embedded in the list
+                for embedded in ptr:
+                    if isinstance(embedded, Mapping) and each in embedded:
+                        ptr = embedded[each]
+                        embed_match = True
+                        break
+                if not embed_match:
+                    return default
+            else:
+                try:
+                    ptr = ptr[idx]
+                except IndexError:
+                    return default
+        else:
+            try:
+                ptr = ptr[each]
+            except (KeyError, IndexError, TypeError):
+                return default
+    return ptr
+
+
+def traverse_dict_and_list(data, key, default=None,
+                           delimiter=DEFAULT_TARGET_DELIM):
+    '''
+    Traverse a dict or list using a colon-delimited (or otherwise delimited,
+    using the ``delimiter`` param) target string. The target ``foo:bar:0``
+    will return ``data['foo']['bar'][0]`` if this value exists, and will
+    otherwise return the dict in the default argument.
+
+    Function will automatically determine the target type. The target
+    ``foo:bar:0`` will return ``data['foo']['bar'][0]`` if data looks like
+    ``{'foo':{'bar':['baz']}}``, and if data looks like
+    ``{'foo':{'bar':{'0':'baz'}}}`` then ``data['foo']['bar']['0']``.
+    A non-integer path component addressing a list is looked up in the
+    dicts embedded in that list.
+    '''
+    return _traverse_parts(data, key.split(delimiter), default)
+
+
+def _compile_value_match(pattern, regex_match=False, exact_match=False):
+    '''
+    Return a callable testing a value against ``pattern``. Matching is case
+    insensitive and uses a glob unless ``regex_match`` or ``exact_match`` is
+    set.
+    '''
+    pattern = pattern.lower()
+    if exact_match:
+        return lambda target: six.text_type(target).lower() == pattern
+    if regex_match:
+        try:
+            regex = re.compile(pattern)
+        except re.error:
+            log.error('Invalid regular expression: %s', pattern)
+            return lambda target: False
+    else:
+        regex = re.compile(fnmatch.translate(pattern))
+    return lambda target: regex.match(six.text_type(target).lower()) is not None
+
+
+def _has_glob(pattern):
+    '''
+    Return True if ``pattern`` contains glob special characters
+    '''
+    return any(char in pattern for char in '*?[')
+
+
+class PathQuery(object):
+    '''
+    A precompiled ``subdict_match`` expression.
+
+    The expression is split once and every candidate ``(path, value)`` pair
+    is prepared up front, so the same query can be run against many
+    documents without re-parsing it:
+
+    .. code-block:: python
+
+        >>> query = PathQuery('os_family:Debian')
+        >>> query.match({'os_family': 'Debian'})
+        True
+        >>> query.filter({'web1': grains1, 'db1': grains2})
+        ['web1']
+    '''
+
+    def __init__(self, expr, delimiter=DEFAULT_TARGET_DELIM,
+                 regex_match=False, exact_match=False):
+        self.expr = expr
+        self.delimiter = delimiter
+        self.regex_match = regex_match
+        self.exact_match = exact_match
+
+        splits = expr.split(delimiter)
+        # If we have 4 splits, then we have three delimiters. Thus, the
+        # indexes we want to use are 3, 2, and 1, in that order.
+        self.candidates = []
+        for idx in range(len(splits) - 1, 0, -1):
+            parts = tuple(splits[:idx])
+            if parts == ('*',):
+                # We are matching on everything under the top level, so the
+                # match is tested against the entire document
+                matchstr = expr
+                parts = None
+            else:
+                matchstr = delimiter.join(splits[idx:])
+            value_match = _compile_value_match(
+                matchstr, regex_match, exact_match)
+            self.candidates.append((
+                parts,
+                value_match,
+                self._dict_plan(matchstr, value_match),
+            ))
+
+    def _dict_plan(self, pattern, value_match):
+        '''
+        Prepare everything ``_dict_match`` needs to test ``pattern`` against
+        a dict, as ``(wildcard, pattern, value_match, glob_keys, query,
+        inner)``. ``inner`` is the plan used for the values of the dict when
+        the pattern starts with a ``*`` wildcard component.
+        '''
+        wildcard = pattern.startswith('*' + self.delimiter)
+        inner = None
+        if wildcard:
+            pattern = pattern[len(self.delimiter) + 1:]
+            value_match = _compile_value_match(
+                pattern, self.regex_match, self.exact_match)
+            inner = self._dict_plan(pattern, value_match)
+        # Keys are only matched against globs, not regexes or exact values
+        glob_keys = not self.regex_match and not self.exact_match \
+            and _has_glob(pattern) and self.delimiter not in pattern
+        query = self.compile(pattern, self.delimiter, self.regex_match,
+                             self.exact_match)
+        return wildcard, pattern, value_match, glob_keys, query, inner
+
+    @classmethod
+    def compile(cls, expr, delimiter=DEFAULT_TARGET_DELIM,
+                regex_match=False, exact_match=False):
+        '''
+        Return a cached query for ``expr``, compiling it if needed
+        '''
+        return _compile_path_query(cls, expr, delimiter, bool(regex_match),
+                                   bool(exact_match))
+
+    def _dict_match(self, target, plan):
+        wildcard, pattern, value_match, glob_keys, query, inner = plan
+
+        if pattern == '*':
+            # We are just checking that the key exists
+            return True
+        elif pattern in target:
+            # We might want to search for a key
+            return True
+        elif glob_keys and any(value_match(key) for key in target):
+            # Glob-style key match
+            return True
+        elif query.match(target):
+            return True
+        if wildcard:
+            for value in six.itervalues(target):
+                if isinstance(value, Mapping):
+                    if self._dict_match(value, inner):
+                        return True
+                elif isinstance(value, list):
+                    for item in value:
+                        if value_match(item):
+                            return True
+                elif value_match(value):
+                    return True
+        return False
+
+    def match(self, data):
+        '''
+        Return True if ``data`` matches the query
+        '''
+        for parts, value_match, plan in self.candidates:
+            if parts is None:
+                match = data
+            else:
+                match = _traverse_parts(data, parts, {})
+            if match == {}:
+                continue
+            if isinstance(match, Mapping):
+                if self._dict_match(match, plan):
+                    return True
+                continue
+            if isinstance(match, (list, tuple)):
+                # We are matching a single component to a single list member
+                for member in match:
+                    if isinstance(member, Mapping):
+                        if self._dict_match(member, plan):
+                            return True
+                    if value_match(member):
+                        return True
+                continue
+            if value_match(match):
+                return True
+        return False
+
+    def filter(self, documents):
+        '''
+        Match many documents in one pass. If ``documents`` is a mapping of
+        ids to documents the matching ids are returned, otherwise the
+        matching documents themselves.
+        '''
+        match = self.match
+        if isinstance(documents, Mapping):
+            return [key for key, doc in six.iteritems(documents) if match(doc)]
+        return [doc for doc in documents if match(doc)]
+
+
+@bounded_memoize(PATH_QUERY_CACHE_SIZE)
+def _compile_path_query(cls, expr, delimiter, regex_match, exact_match):
+    return cls(expr, delimiter, regex_match, exact_match)
+
+
+def subdict_match(data, expr, delimiter=DEFAULT_TARGET_DELIM,
+                  regex_match=False, exact_match=False):
+    '''
+    Check for a match in a dictionary using a delimiter character to denote
+    levels of subdicts, and also allowing the delimiter character to be
+    matched. Thus, ``foo:bar:baz`` will match data like:
+
+    .. code-block:: python
+
+        {'foo': {'bar': {'baz': True}}}
+        {'foo': {'bar': 'baz'}}
+        {'foo': {'bar': ['baz']}}
+        {'foo': {'bar': 'baz:qux'}}
+
+    Values are matched as globs unless ``regex_match`` or ``exact_match`` is
+    passed. When the last component addresses a dict, glob characters in it
+    are matched against the dict's keys. Compiled expressions are cached, use
+    ``PathQuery`` directly to match one expression against many documents.
+    '''
+    return PathQuery.compile(expr, delimiter, regex_match, exact_match).match(data)
+
+
+def _same_value(old, new):
+    '''
+    Equality test which, unlike ``==``, tells apart values of different
+    types such as ``1``, ``1.0`` and ``True``. Mappings of any type are
+    compared by their contents. Identity and the (usually cached) hash of
+    hashable values are checked before falling back to a full comparison.
+    '''
+    if old is new:
+        return True
+    if isinstance(old, Mapping) and isinstance(new, Mapping):
+        if len(old) != len(new):
+            return False
+        for key, value in six.iteritems(old):
+            if key not in new or not _same_value(value, new[key]):
+                return False
+        return True
+    if type(old) is not type(new):
+        return False
+    if isinstance(old, (list, tuple)):
+        return len(old) == len(new) and \
+            all(_same_value(a, b) for a, b in zip(old, new))
+    try:
+        if hash(old) != hash(new):
+            return False
+    except TypeError:
+        pass
+    return old == new
+
+
+def recursive_diff(old, new):
+    '''
+    Compare two nested dictionaries and return only what changed, as a dict
+    with the keys ``added``, ``removed`` and ``changed``. Each of these maps a
+    path, a tuple of keys, to the new value, the old value or a dict with
+    ``old`` and ``new`` values respectively. Lists and other non-dict values
+    are compared as a whole.
+
+    Identical subtrees are skipped without being walked, so diffing a
+    document against one derived from it with
+    ``slacker.utils.dictupdate.merge`` only costs as much as the changes.
+
+    .. code-block:: python
+
+        >>> recursive_diff({'a': {'b': 1, 'c': 2}}, {'a': {'b': 1, 'c': 3}})
+        {'added': {}, 'removed': {}, 'changed': {('a', 'c'): {'old': 2, 'new': 3}}}
+    '''
+    ret = {'added': {}, 'removed': {}, 'changed': {}}
+    if _same_value(old, new):
+        return ret
+    stack = [((), old, new)]
+    while stack:
+        path, old_dict, new_dict = stack.pop()
+        for key, old_value in six.iteritems(old_dict):
+            if key not in new_dict:
+                ret['removed'][path + (key,)] = old_value
+                continue
+            new_value = new_dict[key]
+            if old_value is new_value:
+                continue
+            if isinstance(old_value, Mapping) and isinstance(new_value, Mapping):
+                if not _same_value(old_value, new_value):
+                    stack.append((path + (key,), old_value, new_value))
+            elif not _same_value(old_value, new_value):
+                ret['changed'][path + (key,)] = {'old': old_value,
+                                                 'new': new_value}
+        for key, new_value in six.iteritems(new_dict):
+            if key not in old_dict:
+                ret['added'][path + (key,)] = new_value
+    return ret
+
+
+def apply_patch(data, patch):
+    '''
+    Apply a change set returned by ``recursive_diff`` to ``data`` and return
+    the result. ``data`` is not modified, only the dictionaries along the
+    patched paths are copied and the rest is shared with ``data``.
+    '''
+    ret = copy.copy(data)
+    # Maps the id of every dict copied so far to the copy itself
+    copied = {id(ret): ret}
+
+    def _container(path):
+        ptr = ret
+        for key in path:
+            child = ptr.get(key)
+            if not isinstance(child, Mapping):
+                child = ptr[key] = {}
+                copied[id(child)] = child
+            elif id(child) not in copied:
+                child = ptr[key] = copy.copy(child)
+                copied[id(child)] = child
+            ptr = child
+        return ptr
+
+    for path in patch.get('removed', {}):
+        parent = _traverse_parts(ret, path[:-1])
+        if isinstance(parent, Mapping) and path[-1] in parent:
+            del _container(path[:-1])[path[-1]]
+    for path, value in six.iteritems(patch.get('added', {})):
+        _container(path[:-1])[path[-1]] = value
+    for path, value in six.iteritems(patch.get('changed', {})):
+        _container(path[:-1])[path[-1]] = value['new']
+    return ret
+
+
+class FrozenDict(Mapping):
+    '''
+    Immutable and hashable mapping returned by ``freeze``. The hash is
+    computed once and cached.
+    '''
+    __slots__ = ('_data', '_hash', '__weakref__')
+
+    def __init__(self, *args, **kwargs):
+        self._data = dict(*args, **kwargs)
+        self._hash = None
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(frozenset(six.iteritems(self._data)))
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, FrozenDict):
+            if hash(self) != hash(other):
+                return False
+            return self._data == other._data
+        if isinstance(other, Mapping):
+            return self._data == dict(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        ret = self.__eq__(other)
+        return ret if ret is NotImplemented else not ret
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__, self._data)
+
+    def __reduce__(self):
+        return self.__class__, (self._data,)
+
+
+class FrozenList(Sequence):
+    '''
+    Immutable and hashable sequence returned by ``freeze``. It compares equal
+    to a tuple with the same items and the hash is computed once and cached.
+    '''
+    __slots__ = ('_data', '_hash', '__weakref__')
+
+    def __init__(self, iterable=()):
+        self._data = tuple(iterable)
+        self._hash = None
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.__class__(self._data[index])
+        return self._data[index]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(self._data)
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, FrozenList):
+            if hash(self) != hash(other):
+                return False
+            return self._data == other._data
+        if isinstance(other, tuple):
+            return self._data == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        ret = self.__eq__(other)
+        return ret if ret is NotImplemented else not ret
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__, list(self._data))
+
+    def __reduce__(self):
+        return self.__class__, (self._data,)
+
+
+# Hash-consing table for frozen values, mapping the typed key of each
+# canonical value (see _intern_key) to the value itself. Values of different
+# types are never merged even if they compare equal, e.g. 1, 1.0 and True.
+_FROZEN = weakref.WeakValueDictionary()
+_FROZEN_LOCK = threading.Lock()
+
+
+def _intern_key(value):
+    '''
+    Return a key identifying ``value`` including its type. Frozen containers
+    are already canonical and identified by their id, which stays valid as
+    long as the canonical container holding them is alive.
+    '''
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return type(value), id(value)
+    if isinstance(value, frozenset):
+        return frozenset, frozenset(_intern_key(item) for item in value)
+    return type(value), value
+
+
+def _intern(obj):
+    try:
+        if isinstance(obj, FrozenDict):
+            key = FrozenDict, frozenset(
+                (_intern_key(k), _intern_key(v)) for k, v in six.iteritems(obj)
+            )
+        else:
+            key = FrozenList, tuple(_intern_key(item) for item in obj)
+        hash(key)
+    except TypeError:
+        # Unhashable leaves, can't be interned
+        return obj
+    with _FROZEN_LOCK:
+        canonical = _FROZEN.get(key)
+        if canonical is None:
+            _FROZEN[key] = canonical = obj
+    return canonical
+
+
+def freeze(data):
+    '''
+    Return an immutable copy of ``data``. Dicts become ``FrozenDict``, lists
+    and tuples become ``FrozenList`` and sets become ``frozenset``. Frozen
+    values are hash-consed, so freezing equal subtrees, even in different
+    documents, returns the very same object. Identical frozen documents can
+    therefore be compared in O(1) and used as memoization keys.
+    '''
+    if isinstance(data, (FrozenDict, FrozenList)):
+        return data
+    if isinstance(data, Mapping):
+        return _intern(FrozenDict(
+            (freeze(key), freeze(value)) for key, value in six.iteritems(data)
+        ))
+    if isinstance(data, (list, tuple)):
+        return _intern(FrozenList(freeze(item) for item in data))
+    if isinstance(data, (set, frozenset)):
+        return frozenset(freeze(item) for item in data)
+    return data
+
+
+def _thaw_hashable(data):
+    '''
+    Thaw a dict key or set member, which has to stay hashable: sequences
+    become tuples, sets frozensets and mappings are left frozen
+    '''
+    if isinstance(data, FrozenList):
+        return tuple(_thaw_hashable(item) for item in data)
+    if isinstance(data, frozenset):
+        return frozenset(_thaw_hashable(item) for item in data)
+    return data
+
+
+def thaw(data):
+    '''
+    Return a mutable copy of data returned by ``freeze``. Dict keys and set
+    members have to stay hashable, so sequences in them become tuples.
+    '''
+    if isinstance(data, Mapping):
+        return dict(
+            (_thaw_hashable(key), thaw(value))
+            for key, value in six.iteritems(data)
+        )
+    if isinstance(data, FrozenList):
+        return [thaw(item) for item in data]
+    if isinstance(data, frozenset):
+        return set(_thaw_hashable(item) for item in data)
+    return data
+
+
+def _is_ascii(text):
+    '''
+    Return True if ``text`` only holds ASCII characters
+    '''
+    try:
+        return text.isascii()
+    except AttributeError:
+        # Python < 3.7
+        try:
+            text.encode('ascii')
+        except UnicodeError:
+            return False
+        return True
+
+
+def _nfc(text):
+    '''
+    NFC normalize ``text``, skipping the work for ASCII-only strings which
+    are always normalized already
+    '''
+    if _is_ascii(text):
+        return text
+    return unicodedata.normalize('NFC', text)
+
+
+def iter_unicode(items, encoding=None, errors='strict', normalize=False):
+    '''
+    Generator version of ``to_unicode_many``
+    '''
+    system_encoding = slacker.utils.stringutils.SYSTEM_ENCODING
+    for item in items:
+        if isinstance(item, six.text_type):
+            yield _nfc(item) if normalize else item
+            continue
+        if not isinstance(item, (six.binary_type, bytearray)):
+            raise TypeError(
+                'expected str, bytes or bytearray not {0}'.format(type(item))
+            )
+        if encoding:
+            item = item.decode(encoding, errors)
+        else:
+            try:
+                item = item.decode('utf-8', errors)
+            except UnicodeDecodeError:
+                item = item.decode(system_encoding, errors)
+        yield _nfc(item) if normalize else item
+
+
+def iter_bytes(items, encoding=None, errors='strict'):
+    '''
+    Generator version of ``to_bytes_many``
+    '''
+    system_encoding = slacker.utils.stringutils.SYSTEM_ENCODING
+    for item in items:
+        if isinstance(item, six.binary_type):
+            yield item
+        elif isinstance(item, bytearray):
+            yield bytes(item)
+        elif isinstance(item, six.text_type):
+            if encoding:
+                yield item.encode(encoding, errors)
+            else:
+                try:
+                    yield item.encode('utf-8', errors)
+                except UnicodeEncodeError:
+                    yield item.encode(system_encoding, errors)
+        else:
+            raise TypeError(
+                'expected bytes, bytearray or str not {0}'.format(type(item))
+            )
+
+
+def to_unicode_many(items, encoding=None, errors='strict', normalize=False):
+    '''
+    Convert every item of ``items`` to unicode (str on Python 3) and return
+    them as a list. Items which already are unicode are passed through
+    untouched unless ``normalize`` is True, in which case non-ASCII strings
+    are NFC normalized.
+    '''
+    return list(iter_unicode(items, encoding, errors, normalize))
+
+
+def to_bytes_many(items, encoding=None, errors='strict'):
+    '''
+    Convert every item of ``items`` to bytes and return them as a list.
+    Items which already are bytes are passed through untouched.
+    '''
+    return list(iter_bytes(items, encoding, errors))
+
+
+def to_str_many(items, encoding=None, errors='strict', normalize=False):
+    '''
+    Convert every item of ``items`` to ``str`` and return them as a list,
+    see ``to_unicode_many`` and ``to_bytes_many``.
+    '''
+    if six.PY3:
+        return to_unicode_many(items, encoding, errors, normalize)
+    if normalize:
+        items = iter_unicode(items, encoding, errors, normalize)
+    return to_bytes_many(items, encoding, errors)
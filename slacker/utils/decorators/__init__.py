@@ -1,6 +1,31 @@
 from __future__ import absolute_import, print_function, unicode_literals
+import collections
+import functools
 import os
 import sys
+import threading
+import time
+
+try:
+    from collections.abc import Coroutine as _Coroutine
+except ImportError:
+    _Coroutine = object
+
+try:
+    _monotonic = time.monotonic
+except AttributeError:
+    _monotonic = time.time
+
+# Flag set on the code of ``async def`` functions, inspect.CO_COROUTINE
+_CO_COROUTINE = 0x80
+
+# Separates the positional from the keyword arguments in cache keys
+_KWARGS_MARK = object()
+_MISSING = object()
+
+CacheInfo = collections.namedtuple(
+    'CacheInfo', ('hits', 'misses', 'maxsize', 'currsize')
+)
 
 
 def decode_string(func):
@@ -10,4 +35,296 @@ def decode_string(func):
             encoding = 'utf-8'
         decoded = string.decode(encoding)
         return decoded
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+
+class _PendingCall(object):
+    '''
+    A computation in progress which other threads asking for the same
+    arguments wait for
+    '''
+    __slots__ = ('thread', 'event', 'value', 'exception')
+
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.event = threading.Event()
+        self.value = None
+        self.exception = None
+
+    def wait(self):
+        self.event.wait()
+        if self.exception is not None:
+            raise self.exception
+        return self.value
+
+
+class _MemoizedCoroutine(_Coroutine):
+    '''
+    Coroutine returned by a memoized coroutine function. Like a native
+    coroutine nothing runs until it is awaited, ``start`` is then called in
+    the running event loop and must return a future.
+    '''
+    def __init__(self, start):
+        self._start = start
+        self._iter = None
+
+    def _get_iter(self):
+        if self._iter is None:
+            self._iter = self._start().__await__()
+        return self._iter
+
+    def __await__(self):
+        return self._get_iter()
+
+    def send(self, value):
+        return self._get_iter().send(value)
+
+    def throw(self, *args):
+        return self._get_iter().throw(*args)
+
+    def close(self):
+        if self._iter is not None:
+            self._iter.close()
+
+
+class Memoize(object):
+    '''
+    Cache the return values of ``func`` by its arguments.
+
+    maxsize
+        Number of results kept, the least recently used ones are dropped
+        first. Unbounded if None.
+
+    ttl
+        Number of seconds a result is kept. Forever if None.
+
+    Concurrent calls with the same arguments are collapsed: the first one
+    runs ``func`` while the others wait for its result. Exceptions are
+    passed on to the waiting calls but not cached. Coroutine functions get
+    the same treatment: concurrent callers in the same event loop await the
+    same task, and its result is cached once it completes.
+
+    The cache is emptied in a process forked from the one which filled it.
+    Calls with unhashable arguments are not cached.
+
+    The wrapper is not a function, so ``asyncio.iscoroutinefunction`` and
+    ``inspect.iscoroutinefunction`` return False for memoized coroutine
+    functions. Check the ``is_coroutine`` attribute instead.
+    '''
+    def __init__(self, func, maxsize=None, ttl=None):
+        self.func = func
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Not using inspect.iscoroutinefunction, importing inspect would
+        # slow down importing every module using this one
+        code = getattr(func, '__code__', None)
+        self.is_coroutine = bool(getattr(code, 'co_flags', 0) & _CO_COROUTINE)
+        functools.update_wrapper(self, func)
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._cache = collections.OrderedDict()
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _make_key(self, args, kwargs):
+        key = args
+        if kwargs:
+            key += (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+        hash(key)
+        return key
+
+    def _lookup(self, key):
+        '''
+        Return the cached value for ``key`` or ``_MISSING``. Must be called
+        with the lock held.
+        '''
+        try:
+            value, expires = self._cache[key]
+        except KeyError:
+            return _MISSING
+        if expires is not None and expires <= _monotonic():
+            del self._cache[key]
+            return _MISSING
+        if self.maxsize is not None:
+            # Mark it as the most recently used
+            del self._cache[key]
+            self._cache[key] = (value, expires)
+        return value
+
+    def _store(self, key, value):
+        '''
+        Cache ``value`` for ``key``. Must be called with the lock held.
+        '''
+        expires = None if self.ttl is None else _monotonic() + self.ttl
+        self._cache[key] = (value, expires)
+        if self.maxsize is not None:
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def __call__(self, *args, **kwargs):
+        if self._pid != os.getpid():
+            self._reset()
+        try:
+            key = self._make_key(args, kwargs)
+        except TypeError:
+            return self.func(*args, **kwargs)
+        if self.is_coroutine:
+            return self._call_coroutine(key, args, kwargs)
+
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            call = self._pending.get(key)
+            if call is None:
+                call = self._pending[key] = _PendingCall()
+                self.misses += 1
+                leader = True
+            else:
+                self.hits += 1
+                leader = False
+        if not leader:
+            if call.thread is threading.current_thread():
+                # Recursive call with the same arguments
+                return self.func(*args, **kwargs)
+            return call.wait()
+
+        try:
+            value = self.func(*args, **kwargs)
+        except BaseException:
+            call.exception = sys.exc_info()[1]
+            with self._lock:
+                self._pending.pop(key, None)
+            call.event.set()
+            raise
+        with self._lock:
+            self._store(key, value)
+            self._pending.pop(key, None)
+        call.value = value
+        call.event.set()
+        return value
+
+    def _call_coroutine(self, key, args, kwargs):
+        '''
+        Return a coroutine for ``func(*args, **kwargs)``, see
+        ``_await_coroutine``
+        '''
+        return _MemoizedCoroutine(
+            functools.partial(self._await_coroutine, key, args, kwargs)
+        )
+
+    def _await_coroutine(self, key, args, kwargs):
+        '''
+        Return a future for the result of ``func(*args, **kwargs)``. The
+        results are cached once computed. While in progress the task
+        computing them is shared by the callers in the same event loop.
+        '''
+        import asyncio
+
+        loop = asyncio.get_event_loop()
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                future = loop.create_future()
+                future.set_result(value)
+                return future
+            task = self._pending.get((loop, key))
+            if task is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                task = loop.create_task(self.func(*args, **kwargs))
+                self._pending[(loop, key)] = task
+                task.add_done_callback(
+                    functools.partial(self._coroutine_done, loop, key)
+                )
+        # A caller being cancelled must not cancel the others
+        return asyncio.shield(task)
+
+    def _coroutine_done(self, loop, key, task):
+        with self._lock:
+            if self._pending.get((loop, key)) is task:
+                del self._pending[(loop, key)]
+            if not task.cancelled() and task.exception() is None:
+                self._store(key, task.result())
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return functools.partial(self, instance)
+
+    def cache_info(self):
+        '''
+        Return the hit and miss counts and the size of the cache
+        '''
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize,
+                             len(self._cache))
+
+    def cache_clear(self):
+        '''
+        Drop all the cached results and reset the statistics
+        '''
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def memoize(func=None, maxsize=None, ttl=None):
+    '''
+    Memoize ``func``, see ``Memoize``. Can be used as ``@memoize`` for an
+    unbounded cache, or as ``@memoize(maxsize=..., ttl=...)``.
+    '''
+    if func is None:
+        return functools.partial(memoize, maxsize=maxsize, ttl=ttl)
+    return Memoize(func, maxsize=maxsize, ttl=ttl)
+
+
+def lru_memoize(maxsize=128):
+    '''
+    Memoize keeping the ``maxsize`` most recently used results
+    '''
+    return memoize(maxsize=maxsize)
+
+
+def ttl_memoize(ttl, maxsize=None):
+    '''
+    Memoize keeping the results for ``ttl`` seconds
+    '''
+    return memoize(maxsize=maxsize, ttl=ttl)
+
+
+def bounded_memoize(maxsize):
+    '''
+    Lightweight memoize for hot functions of hashable positional arguments.
+    The results are kept in a plain dict which is emptied once it holds
+    ``maxsize`` of them: a hit costs a dict lookup, but there is no LRU
+    order, TTL or collapsing of concurrent calls like with ``Memoize``.
+    Calls with unhashable arguments are not cached.
+    '''
+    def decorator(func):
+        cache = {}
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            try:
+                return cache[args]
+            except KeyError:
+                pass
+            except TypeError:
+                return func(*args)
+            value = func(*args)
+            if len(cache) >= maxsize:
+                cache.clear()
+            cache[args] = value
+            return value
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
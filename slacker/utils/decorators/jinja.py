@@ -4,11 +4,174 @@ Jinja-specific decorators
 
 # Python libs
 from __future__ import absolute_import, print_function, unicode_literals
+import importlib
 import logging
+import threading
 
 
 log = logging.getLogger(__name__)
 
+# Filters, tests and globals shipped with slacker, as name: (module,
+# attribute). They are only imported the first time a template uses them.
+DEFAULT_FILTERS = {
+    'to_bytes': ('slacker.utils.stringutils', 'to_bytes'),
+    'to_num': ('slacker.utils.stringutils', 'to_num'),
+    'str_to_num': ('slacker.utils.stringutils', 'to_num'),
+    'is_hex': ('slacker.utils.stringutils', 'is_hex'),
+    'random_str': ('slacker.utils.stringutils', 'random'),
+    'contains_whitespace': ('slacker.utils.stringutils', 'contains_whitespace'),
+    'check_whitelist_blacklist': ('slacker.utils.stringutils',
+                                  'check_whitelist_blacklist'),
+    'json_encode_dict': ('slacker.utils.data', 'encode_dict'),
+    'json_decode_dict': ('slacker.utils.data', 'encode_dict'),
+    'json_encode_list': ('slacker.utils.data', 'encode_list'),
+    'json_decode_list': ('slacker.utils.data', 'encode_list'),
+}
+DEFAULT_TESTS = {}
+DEFAULT_GLOBALS = {}
+
+
+class JinjaRegistry(object):
+    '''
+    Registry of jinja filters, tests and globals recorded by module and
+    attribute name, so registering them doesn't import anything
+    '''
+    def __init__(self):
+        self.filters = dict(DEFAULT_FILTERS)
+        self.tests = dict(DEFAULT_TESTS)
+        self.globals = dict(DEFAULT_GLOBALS)
+        self._resolved = {}
+        self._lock = threading.Lock()
+
+    def register_filter(self, name, module, attribute=None):
+        self.filters[name] = (module, attribute or name)
+
+    def register_test(self, name, module, attribute=None):
+        self.tests[name] = (module, attribute or name)
+
+    def register_global(self, name, module, attribute=None):
+        self.globals[name] = (module, attribute or name)
+
+    def resolve(self, module, attribute):
+        '''
+        Import ``module`` and return its ``attribute``, caching the result
+        '''
+        key = (module, attribute)
+        try:
+            return self._resolved[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._resolved:
+                self._resolved[key] = getattr(
+                    importlib.import_module(module), attribute
+                )
+        return self._resolved[key]
+
+
+registry = JinjaRegistry()
+
+
+class LazyMap(dict):
+    '''
+    Dictionary of jinja filters, tests or globals which imports the ones
+    recorded in a registry table the first time they are looked up
+    '''
+    def __init__(self, eager=None, lazy=None, resolve=None):
+        dict.__init__(self, eager or {})
+        self._lazy = lazy if lazy is not None else {}
+        self._resolve = resolve or registry.resolve
+
+    def __missing__(self, name):
+        try:
+            module, attribute = self._lazy[name]
+        except KeyError:
+            raise KeyError(name)
+        try:
+            value = self._resolve(module, attribute)
+        except (ImportError, AttributeError) as exc:
+            log.error('Failed to load jinja function \'%s\': %s', name, exc)
+            raise KeyError(name)
+        self[name] = value
+        return value
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name) or name in self._lazy
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(set(dict.keys(self)) | set(self._lazy))
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        '''
+        Return all the entries, importing the lazy ones. Entries which fail
+        to import are left out.
+        '''
+        ret = []
+        for name in self.keys():
+            try:
+                ret.append((name, self[name]))
+            except KeyError:
+                continue
+        return ret
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def copy(self):
+        # dict(self) would go through keys() and import every lazy entry
+        return self.__class__(
+            dict(dict.items(self)), self._lazy, self._resolve
+        )
+
+
+_ENVIRONMENTS = {}
+_ENVIRONMENTS_LOCK = threading.Lock()
+
+
+def _populate_environment(env):
+    '''
+    Replace the filters, tests and globals of ``env`` with lazy maps backed
+    by ``registry``
+    '''
+    env.filters = LazyMap(env.filters, registry.filters)
+    env.tests = LazyMap(env.tests, registry.tests)
+    env.globals = LazyMap(env.globals, registry.globals)
+    return env
+
+
+def get_environment(**kwargs):
+    '''
+    Return a jinja environment whose filters, tests and globals are loaded
+    lazily from ``registry``. Environments created with the same hashable
+    keyword arguments are cached and shared.
+    '''
+    # Imported here so that registering filters doesn't require jinja2
+    import jinja2
+
+    try:
+        key = tuple(sorted(kwargs.items()))
+        hash(key)
+    except TypeError:
+        return _populate_environment(jinja2.Environment(**kwargs))
+    with _ENVIRONMENTS_LOCK:
+        if key not in _ENVIRONMENTS:
+            _ENVIRONMENTS[key] = _populate_environment(
+                jinja2.Environment(**kwargs)
+            )
+        return _ENVIRONMENTS[key]
+
 
 class JinjaFilter(object):
     '''
@@ -25,6 +188,10 @@ class JinjaFilter(object):
         if name not in self.salt_jinja_filters:
             log.debug('Marking \'%s\' as a jinja filter', name)
             self.salt_jinja_filters[name] = function
+            if name not in registry.filters:
+                registry.register_filter(
+                    name, function.__module__, function.__name__
+                )
         return function
 
 
@@ -36,16 +203,20 @@ class JinjaTest(object):
     Decorator used to specify that a function is to be loaded as a
     Jinja test.
     '''
-    salt_jinja_filters = {}
+    salt_jinja_tests = {}
 
     def __init__(self, name=None):
         self.name = name
 
-    def __cal__(self, function):
+    def __call__(self, function):
         name = self.name or function.__name__
-        if name not in self.salt_jinja_filters:
+        if name not in self.salt_jinja_tests:
             log.debug('Marking \'%s\' as a jinja test', name)
-            self.salt_jinja_filters[name] = function
+            self.salt_jinja_tests[name] = function
+            if name not in registry.tests:
+                registry.register_test(
+                    name, function.__module__, function.__name__
+                )
         return function
 
 
@@ -57,17 +228,21 @@ class JinjaGlobal(object):
     Decorator used to specify that a function is to be loaded as a
     Jinja global.
     '''
-    salt_jinja_filters = {}
-    
+    salt_jinja_globals = {}
+
     def __init__(self, name=None):
         self.name = name
 
     def __call__(self, function):
         name = self.name or function.__name__
-        if name not in self.salt_jinja_filters:
+        if name not in self.salt_jinja_globals:
             log.debug('Marking \'%s\' as a jinja global', name)
-            self.salt_jinja_filters[name] = function
+            self.salt_jinja_globals[name] = function
+            if name not in registry.globals:
+                registry.register_global(
+                    name, function.__module__, function.__name__
+                )
         return function
 
 
-jinja_global = JinjaGlobal
\ No newline at end of file
+jinja_global = JinjaGlobal
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+'''
+Merge nested dictionaries using one of several merge strategies
+
+The merge engine walks the data with an explicit stack instead of recursion
+and copies a dictionary only when something below it changes. Branches that
+are left untouched by the merge are shared between the inputs and the
+result, so callers must not modify the result in place below the top level
+unless they copy it first.
+
+Available strategies:
+
+    overwrite   = top level keys of the update replace the original ones
+    recurse     = dictionaries are merged recursively, anything else
+                  (including lists) is replaced
+    aggregate   = like recurse, but lists are merged keeping the unique
+                  items of both
+    list-append = like recurse, but lists are concatenated
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import copy
+import logging
+
+try:
+    from collections.abc import Mapping, MutableMapping
+except ImportError:
+    from collections import Mapping, MutableMapping
+
+# Import 3rd-party libs
+from slacker.ext import six
+
+log = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _copy_mapping(obj):
+    '''
+    Shallow copy a mapping into something which can be updated
+    '''
+    if isinstance(obj, MutableMapping):
+        return copy.copy(obj)
+    return dict(obj)
+
+
+def _append_lists(current, value):
+    return current + value
+
+
+def _aggregate_lists(current, value):
+    '''
+    Return ``current`` followed by the items of ``value`` it doesn't hold
+    yet. Hashable items are looked up in a set, unhashable ones with a
+    linear search.
+    '''
+    ret = list(current)
+    seen = set()
+    for item in current:
+        try:
+            seen.add(item)
+        except TypeError:
+            pass
+    for item in value:
+        try:
+            if item in seen:
+                continue
+            seen.add(item)
+        except TypeError:
+            if item in ret:
+                continue
+        ret.append(item)
+    return ret
+
+
+def _merge(obj_a, obj_b, merge_lists=None):
+    '''
+    Merge ``obj_b`` into a copy of ``obj_a`` without recursing. Only the
+    dictionaries along the paths that are changed by ``obj_b`` are copied.
+
+    ``merge_lists`` is an optional function called with the original and the
+    updated list when both sides of a key are lists.
+    '''
+    ret = _copy_mapping(obj_a)
+    stack = [(ret, obj_b)]
+    while stack:
+        dest, upd = stack.pop()
+        for key, value in six.iteritems(upd):
+            current = dest.get(key, _MISSING)
+            if current is value:
+                continue
+            if isinstance(current, Mapping) and isinstance(value, Mapping):
+                dest[key] = _copy_mapping(current)
+                stack.append((dest[key], value))
+            elif merge_lists is not None \
+                    and isinstance(current, list) \
+                    and isinstance(value, list):
+                dest[key] = merge_lists(current, value)
+            else:
+                dest[key] = value
+    return ret
+
+
+def merge_overwrite(obj_a, obj_b):
+    '''
+    Replace the top level keys of ``obj_a`` with the ones from ``obj_b``
+    '''
+    ret = _copy_mapping(obj_a)
+    ret.update(obj_b)
+    return ret
+
+
+def merge_recurse(obj_a, obj_b, merge_lists=False):
+    '''
+    Recursively merge ``obj_b`` into ``obj_a``. Lists are concatenated if
+    ``merge_lists`` is True, otherwise they are replaced.
+    '''
+    return _merge(obj_a, obj_b, _append_lists if merge_lists else None)
+
+
+def merge_aggregate(obj_a, obj_b):
+    '''
+    Recursively merge ``obj_b`` into ``obj_a``, adding the items of lists in
+    ``obj_b`` which are not already present in ``obj_a``.
+    '''
+    return _merge(obj_a, obj_b, _aggregate_lists)
+
+
+def merge_list(obj_a, obj_b):
+    '''
+    Recursively merge ``obj_b`` into ``obj_a``, concatenating lists
+    '''
+    return _merge(obj_a, obj_b, _append_lists)
+
+
+def merge(obj_a, obj_b, strategy='recurse', merge_lists=False):
+    '''
+    Merge ``obj_b`` into ``obj_a`` using ``strategy`` and return the result.
+    Neither argument is modified.
+    '''
+    if strategy == 'overwrite':
+        return merge_overwrite(obj_a, obj_b)
+    elif strategy == 'aggregate':
+        return merge_aggregate(obj_a, obj_b)
+    elif strategy == 'list-append':
+        return merge_list(obj_a, obj_b)
+    elif strategy != 'recurse':
+        log.warning(
+            'Unknown merging strategy \'%s\', fallback to recurse', strategy
+        )
+    return merge_recurse(obj_a, obj_b, merge_lists)
+
+
+def merge_all(objs, strategy='recurse', merge_lists=False):
+    '''
+    Merge a sequence of dictionaries, later ones taking precedence
+    '''
+    ret = {}
+    for obj in objs:
+        ret = merge(ret, obj, strategy, merge_lists)
+    return ret
@@ -86,12 +86,12 @@ from __future__ import absolute_import, print_function, unicode_literals
 import logging
 import os
 import re
+import shlex
 import stat
 import shutil
 import sys
 import six
 import time
-from subprocess import Popen, PIPE
 try:
     import grp
     import pwd
@@ -100,6 +100,8 @@ except ImportError:
 
 import salt.utils.hashutils
 import salt.defaults.exitcodes
+import slacker.utils.process
+import slacker.utils.stringutils
 
 from salt.utils.filebuffer import BufferedReader
 
@@ -180,26 +182,11 @@ def _parse_size(value):
     else:
         style = '='
 
-    if len(scalar) > 0:
-        multiplier = {'b': 2 ** 0,
-                      'k': 2 ** 10,
-                      'm': 2 ** 20,
-                      'g': 2 ** 30,
-                      't': 2 ** 40}.get(scalar[-1].lower())
-        if multiplier:
-            scalar = scalar[:-1].strip()
-        else:
-            multiplier = 1
-    else:
-        multiplier = 1
-
     try:
-        num = int(scalar) * multiplier
+        num, multiplier = slacker.utils.stringutils.split_size(scalar)
     except ValueError:
-        try:
-            num = int(float(scalar) * multiplier)
-        except ValueError:
-            raise ValueError('invalid size: \'{0}\''.format(value))
+        raise ValueError('invalid size: \'{0}\''.format(value))
+    num = int(num * multiplier)
 
     if style == '-':
         min_size = 0
@@ -373,6 +360,7 @@ class SizeOption(Option):
         m = megabytes
         g = gigabytes
         t = terabytes
+    Sizes can be decimal and the suffixes can also be written kb, kib etc.
     The option name is 'size', e.g. {'size': '+1G'}.
     '''
     def __init__(self, key, value):
@@ -555,22 +543,20 @@ class ExecOption(Option):
         self.command = value
 
     def execute(self, fullpath, fstat, test=False):
+        command = self.command.replace('{}', fullpath)
         try:
-            command = self.command.replace('{}', fullpath)
-            print(salt.utils.args.shlex_split(command))
-            p = Popen(salt.utils.args.shlex_split(command),
-                      stdout=PIPE,
-                      stderr=PIPE)
-            (out, err) = p.communicate()
+            _, out, err = slacker.utils.process.run_command(
+                shlex.split(command)
+            )
             if err:
                 log.error(
                     'Error running command: %s\n\n%s',
                     command,
-                    salt.utils.stringutils.to_str(err))
-            return '{0}:\n{1}\n'.format(command, salt.utils.stringutils.to_str(out))
+                    slacker.utils.stringutils.to_str(err))
+            return '{0}:\n{1}\n'.format(command, slacker.utils.stringutils.to_str(out))
         except Exception as e:
             log.error(
-                'Exception while executing command "%s"%:\n\n%s',
+                'Exception while executing command "%s":\n\n%s',
                 command,
                 e)
             return '{0}: Failed'.format(fullpath)
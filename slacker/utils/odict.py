@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+'''
+Ordered mapping implementations
+
+``OrderedDict`` is the one from the standard library. ``CompactOrderedDict``
+keeps keys and values in two parallel lists plus a dict mapping each key to
+its position, which makes it cheap to look items up by position and to take
+snapshot copies of large documents.
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+from collections import OrderedDict  # pylint: disable=unused-import
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+# Import 3rd-party libs
+from slacker.ext.six.moves import zip
+
+# Marks the slot of a deleted item until the lists are compacted
+_DELETED = object()
+
+
+class CompactOrderedDict(MutableMapping):
+    '''
+    Dictionary that remembers insertion order, stored as parallel key and
+    value lists with a dict indexing the key positions.
+
+    Deleting or moving an item leaves a hole behind which is removed once
+    holes make up half of the lists, or before positional access other than
+    to the first or last item.
+    ``copy()`` is O(1): the copy shares storage with the original until
+    either of them is modified.
+    '''
+    __slots__ = ('_keys', '_values', '_index', '_holes', '_head', '_shared')
+
+    def __init__(self, *args, **kwargs):
+        self._keys = []
+        self._values = []
+        self._index = {}
+        self._holes = 0
+        self._head = 0
+        self._shared = False
+        self.update(*args, **kwargs)
+
+    def _unshare(self):
+        '''
+        Take a private copy of the storage before modifying it
+        '''
+        if self._shared:
+            self._keys = list(self._keys)
+            self._values = list(self._values)
+            self._index = self._index.copy()
+            self._shared = False
+
+    def _compact(self):
+        '''
+        Drop the holes left behind by deleted items
+        '''
+        if not self._holes:
+            return
+        self._unshare()
+        keys = []
+        values = []
+        for key, value in zip(self._keys, self._values):
+            if key is not _DELETED:
+                keys.append(key)
+                values.append(value)
+        self._keys = keys
+        self._values = values
+        self._index = dict((key, pos) for pos, key in enumerate(keys))
+        self._holes = 0
+        self._head = 0
+
+    def _remove(self, key):
+        pos = self._index.pop(key)
+        value = self._values[pos]
+        self._keys[pos] = _DELETED
+        self._values[pos] = None
+        self._holes += 1
+        # Trailing holes are dropped right away so the last slot is always
+        # live, which keeps popping and reading the last item O(1)
+        keys = self._keys
+        while keys and keys[-1] is _DELETED:
+            keys.pop()
+            self._values.pop()
+            self._holes -= 1
+        if self._head > len(keys):
+            self._head = len(keys)
+        if self._holes * 2 > len(keys):
+            self._compact()
+        return value
+
+    def _first(self):
+        '''
+        Return the slot of the first item, skipping the holes before it
+        '''
+        keys = self._keys
+        pos = self._head
+        while keys[pos] is _DELETED:
+            pos += 1
+        self._head = pos
+        return pos
+
+    def _slot(self, pos):
+        '''
+        Return the slot of the item at position ``pos``, only compacting the
+        lists for positions other than the first and the last
+        '''
+        if self._holes:
+            if pos == 0:
+                return self._first()
+            if pos == -1:
+                return len(self._keys) - 1
+            self._compact()
+        return pos
+
+    def __getitem__(self, key):
+        return self._values[self._index[key]]
+
+    def __setitem__(self, key, value):
+        self._unshare()
+        pos = self._index.get(key)
+        if pos is None:
+            self._index[key] = len(self._keys)
+            self._keys.append(key)
+            self._values.append(value)
+        else:
+            self._values[pos] = value
+
+    def __delitem__(self, key):
+        self._unshare()
+        self._remove(key)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        if self._holes:
+            return (key for key in self._keys if key is not _DELETED)
+        return iter(self._keys)
+
+    def __reversed__(self):
+        return (key for key in reversed(self._keys) if key is not _DELETED)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __eq__(self, other):
+        if isinstance(other, (CompactOrderedDict, OrderedDict)):
+            return len(self) == len(other) and \
+                all(a == b for a, b in zip(self.items(), other.items()))
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(self.__class__.__name__, list(self.items()))
+
+    def __reduce__(self):
+        return self.__class__, (list(self.items()),)
+
+    def items(self):
+        if self._holes:
+            return [(key, value) for key, value in zip(self._keys, self._values)
+                    if key is not _DELETED]
+        return list(zip(self._keys, self._values))
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        if self._holes:
+            return [value for key, value in zip(self._keys, self._values)
+                    if key is not _DELETED]
+        return list(self._values)
+
+    def clear(self):
+        self._keys = []
+        self._values = []
+        self._index = {}
+        self._holes = 0
+        self._head = 0
+        self._shared = False
+
+    def copy(self):
+        '''
+        Return a snapshot of the mapping, sharing storage until written to
+        '''
+        ret = self.__class__.__new__(self.__class__)
+        ret._keys = self._keys
+        ret._values = self._values
+        ret._index = self._index
+        ret._holes = self._holes
+        ret._head = self._head
+        ret._shared = self._shared = True
+        return ret
+
+    __copy__ = copy
+
+    def popitem(self, last=True):
+        '''
+        Remove and return the last (or first if ``last`` is False) item
+        '''
+        if not self._index:
+            raise KeyError('dictionary is empty')
+        self._unshare()
+        key = self._keys[-1] if last else self._keys[self._first()]
+        return key, self._remove(key)
+
+    def move_to_end(self, key, last=True):
+        '''
+        Move an existing key to the end, or to the beginning if ``last`` is
+        False. Moving to the end is O(1), moving to the beginning is O(n).
+        '''
+        self._unshare()
+        value = self._remove(key)
+        if last:
+            self[key] = value
+        else:
+            self._compact()
+            self._keys.insert(0, key)
+            self._values.insert(0, value)
+            self._index = dict((k, pos) for pos, k in enumerate(self._keys))
+
+    def key_at(self, pos):
+        '''
+        Return the key at position ``pos``
+        '''
+        return self._keys[self._slot(pos)]
+
+    def item_at(self, pos):
+        '''
+        Return the ``(key, value)`` pair at position ``pos``
+        '''
+        pos = self._slot(pos)
+        return self._keys[pos], self._values[pos]
+
+    def slice(self, start=None, stop=None, step=None):
+        '''
+        Return a new mapping with the items between the positions ``start``
+        and ``stop``
+        '''
+        self._compact()
+        ret = self.__class__()
+        ret._keys = self._keys[start:stop:step]
+        ret._values = self._values[start:stop:step]
+        ret._index = dict((key, pos) for pos, key in enumerate(ret._keys))
+        return ret
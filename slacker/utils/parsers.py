@@ -9,6 +9,7 @@ This is the CLI parser for all of slackers CLI tools
 from __future__ import print_function, absolute_import, unicode_literals
 import os
 import sys
+import atexit
 import signal
 import getpass
 import logging
@@ -17,8 +18,7 @@ import traceback
 from functools import partial
 
 # Import slacker libs
-import slacker.utils.files
-import slacker.utils.data
+import slacker.defaults.exitcodes
 import slacker.version as version
 
 from slacker.defaults import DEFAULT_PATH_DELIM
@@ -56,41 +56,39 @@ class OptionParserMeta(MixInMeta):
                                                         name,
                                                         bases,
                                                         attrs)
-        if not hasattr(instance, '_mixin_setup_funcs'):
-            instance._mixin_setup_funcs = []
-        if not hasattr(instance, '_mixin_process_funcs'):
-            instance._mixin_process_funcs = []
-        if not hasattr(instance, '_mixin_after_parsed_funcs'):
-            instance._mixin_after_parsed_funcs = []
-        if not hasattr(instance, '_mixin_before_exit_funcs'):
-            instance._mixin_before_exit_funcs = []
-
-        for base in _sorted(bases + (instance,)):
-            func = getattr(base, '_mixin_setup', None)
-            if func is not None and func not in instance._mixin_setup_funcs:
-                instance._mixin_setup_funcs.append(func)
-            
-            func = getattr(base, '_mixin_after_parsed_funcs', None)
-            if func is not None and func not in instance._mixin_after_parsed_funcs:
-                instance._mixin_after_parsed_funcs.append(func)
-
-            for func in dir(base):
-                if not func.startswith('process_'):
+        # Build the tables of mix-in functions once per class, in priority
+        # order, so that creating a parser or parsing doesn't search for them
+        instance._mixin_setup_funcs = []
+        instance._mixin_after_parsed_funcs = []
+        instance._mixin_before_exit_funcs = []
+        for base in _sorted(instance.__mro__):
+            base_attrs = vars(base)
+            for attr, funcs in (
+                    ('_mixin_setup', instance._mixin_setup_funcs),
+                    ('_mixin_after_parsed', instance._mixin_after_parsed_funcs),
+                    ('_mixin_before_exit', instance._mixin_before_exit_funcs)):
+                func = base_attrs.get(attr)
+                if func is not None and func not in funcs:
+                    funcs.append(func)
+
+        # The process_<option> functions, as (option, function name), get
+        # the priority of the class defining the one actually called unless
+        # they have their own
+        process_funcs = []
+        seen = set()
+        for base in instance.__mro__:
+            for attr, func in six.iteritems(vars(base)):
+                if not attr.startswith('process_') or attr in seen:
                     continue
-
-                func = getattr(base, func)
-                if getattr(func, '_mixin_prio_', None) is not None:
-                    # Attribute already set, don't override it
-                    continue
-
-                if six.PY2:
-                    func.__func__._mixin_prio_ = getattr(
-                        base, '_mixin_prio_', 1000
-                    )
-                else:
-                    func._mixin_prio_ = getattr(
-                        base, '_mixin_prio_', 1000
-                    )
+                seen.add(attr)
+                prio = getattr(func, '_mixin_prio_', None)
+                if prio is None:
+                    prio = getattr(base, '_mixin_prio_', 1000)
+                process_funcs.append((prio, attr))
+        instance._mixin_process_funcs = [
+            (attr[len('process_'):], attr)
+            for _, attr in sorted(process_funcs, key=lambda pf: pf[0])
+        ]
 
         return instance
 
@@ -116,6 +114,12 @@ class OptionParser(optparse.OptionParser, object):
     # Setup multiprocessing logging queue listener
     _setup_mp_logging_listener_ = False
 
+    # Mix-in function tables, see OptionParserMeta
+    _mixin_setup_funcs = ()
+    _mixin_process_funcs = ()
+    _mixin_after_parsed_funcs = ()
+    _mixin_before_exit_funcs = ()
+
     def __init__(self, *args, **kwargs):
         kwargs.setdefault('version', '%prog {0}'.format(self.VERSION))
         kwargs.setdefault('usage', self.usage)
@@ -153,6 +157,9 @@ class OptionParser(optparse.OptionParser, object):
 
         self.options, self.args = options, args
 
+        if self._setup_mp_logging_listener_:
+            self._setup_mp_logging_listener()
+
         # Get some proper sys.stderr logging as soon as possible
         # This logging handler will be removed once the proper console or
         # logfile logging is setup.
@@ -161,16 +168,11 @@ class OptionParser(optparse.OptionParser, object):
             'error' if temp_log_level is None else temp_log_level
         )
 
-        # Gather and run the process_<option> functions in the proper order
-        process_option_funcs = []
-        for option_key in options.__dict__:
-            process_option_func = getattr(
-                self, 'process_{0}'.format(option_key), None
-            )
-            if process_option_func is not None:
-                process_option_funcs.append(process_option_func)
-
-        for process_option_func in _sorted(process_option_funcs):
+        # Run the process_<option> functions in the proper order
+        for option_key, func_name in self._mixin_process_funcs:
+            if option_key not in options.__dict__:
+                continue
+            process_option_func = getattr(self, func_name)
             try:
                 process_option_func()
             except Exception as err:
@@ -201,6 +203,39 @@ class OptionParser(optparse.OptionParser, object):
         # Retain the standard behavior of optparse to return options and args
         return options, args
 
+    def _setup_mp_logging_listener(self):
+        '''
+        Start the thread receiving the log records of the worker processes,
+        available to them through ``self.log_queue``
+        '''
+        import slacker.utils.process
+        self.log_queue_listener = \
+            slacker.utils.process.setup_mp_logging_listener()
+        self.log_queue = self.log_queue_listener.queue
+        # Flush the records still queued if the program ends without going
+        # through exit()
+        atexit.register(self._stop_mp_logging_listener)
+
+    def _stop_mp_logging_listener(self):
+        '''
+        Stop the listener thread once the records already queued are handled
+        '''
+        listener = getattr(self, 'log_queue_listener', None)
+        if listener is not None:
+            listener.stop()
+
+    def exit(self, status=0, msg=None):
+        # Run the functions on self._mixin_before_exit_funcs
+        for mixin_before_exit_func in self._mixin_before_exit_funcs:
+            try:
+                mixin_before_exit_func(self)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception(
+                    'Error while processing %s', mixin_before_exit_func
+                )
+        self._stop_mp_logging_listener()
+        optparse.OptionParser.exit(self, status, msg)
+
     def _populate_option_list(self, option_list, add_help=True):
         optparse.OptionParser._populate_option_list(
             self, option_list, add_help=add_help
@@ -218,7 +253,7 @@ class OptionParser(optparse.OptionParser, object):
         )
 
     def print_versions_report(self, file=sys.stdout):
-        print('\n'.join(version.version_report()), file=file)
+        print('\n'.join(version.versions_report()), file=file)
         self.exit(slacker.defaults.exitcodes.EX_OK)
 
     
\ No newline at end of file
@@ -1,128 +1,299 @@
+'''
+Functions to identify the platform of the host
+
+All the detection is done once, see ``get_platform_info``. The result is
+kept for the life of the process and inherited by forked workers.
+'''
 from __future__ import absolute_import, print_function, unicode_literals
+import collections
+import errno
+import json
+import logging
 import os
-import subprocess
+import stat
 import sys
+import tempfile
+import threading
+
+log = logging.getLogger(__name__)
+
+PlatformInfo = collections.namedtuple('PlatformInfo', (
+    'system',
+    'uname',
+    'windows',
+    'linux',
+    'darwin',
+    'sunos',
+    'smartos',
+    'smartos_globalzone',
+    'smartos_zone',
+    'freebsd',
+    'netbsd',
+    'openbsd',
+    'aix',
+))
+
+# Name of the file, in the runtime directory, where the platform detected
+# through a subprocess is stored for the next runs
+PLATFORM_CACHE_FILE = 'slacker-platform-{0}.json'
+
+_PLATFORM_INFO = None
+_PLATFORM_INFO_LOCK = threading.Lock()
+
+
+def _get_uname():
+    uname = getattr(os, 'uname', None)
+    if uname is None:
+        return None
+    return list(uname())
+
+
+def _is_private(stat_result, uid):
+    '''
+    Return True if the file described by ``stat_result`` is owned by ``uid``
+    and can't be written by anyone else
+    '''
+    return stat_result.st_uid == uid and not stat_result.st_mode & 0o022
+
+
+def get_runtime_dir():
+    '''
+    Return the directory where runtime files are kept: ``XDG_RUNTIME_DIR``
+    if set, or else a ``slacker-<uid>`` directory only accessible to the
+    current user in the temporary directory, created if needed. Returns
+    None if no such directory can be used safely.
+    '''
+    if not hasattr(os, 'getuid'):
+        return None
+    uid = os.getuid()
+    path = os.environ.get('XDG_RUNTIME_DIR')
+    if not path:
+        path = os.path.join(tempfile.gettempdir(), 'slacker-{0}'.format(uid))
+        try:
+            os.mkdir(path, 0o700)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                return None
+    try:
+        stat_result = os.lstat(path)
+    except OSError:
+        return None
+    # Refuse symlinks and directories other users could plant files in
+    if not stat.S_ISDIR(stat_result.st_mode) or \
+            not _is_private(stat_result, uid):
+        log.debug('Not using %s as runtime directory, it isn\'t private', path)
+        return None
+    return path
+
+
+def _cache_path():
+    runtime_dir = get_runtime_dir()
+    if runtime_dir is None:
+        return None
+    return os.path.join(runtime_dir, PLATFORM_CACHE_FILE.format(os.getuid()))
+
+
+def _load_cache(path, system, uname):
+    '''
+    Return the ``PlatformInfo`` stored in ``path`` if it was detected on
+    the same system and kernel, and the file belongs to the current user
+    '''
+    try:
+        fd_ = os.open(path, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+    except OSError:
+        return None
+    try:
+        with os.fdopen(fd_, 'r') as fp_:
+            if not _is_private(os.fstat(fp_.fileno()), os.getuid()):
+                log.warning('Ignoring the platform cache %s, it isn\'t '
+                            'private to the current user', path)
+                return None
+            data = json.load(fp_)
+        info = PlatformInfo(**data)
+    except (IOError, OSError, ValueError, TypeError):
+        return None
+    if info.system != system or info.uname != uname:
+        return None
+    return info
 
-from salt.utils.decorators import memoize as real_memoize
+
+def _save_cache(path, info):
+    tmp = None
+    try:
+        fd_, tmp = tempfile.mkstemp(
+            prefix=os.path.basename(path) + '.',
+            dir=os.path.dirname(path)
+        )
+        with os.fdopen(fd_, 'w') as fp_:
+            json.dump(info._asdict(), fp_)
+        os.rename(tmp, path)
+    except (IOError, OSError) as exc:
+        log.debug('Unable to cache the platform in %s: %s', path, exc)
+        if tmp is not None:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+def _zonename():
+    '''
+    Return the name of the SmartOS zone of the host, or None if it can't be
+    determined
+    '''
+    import subprocess
+
+    try:
+        proc = subprocess.Popen(
+            ['zonename'], shell=False,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError:
+        return None
+    stdout = proc.communicate()[0]
+    if proc.returncode:
+        return None
+    return stdout.decode('utf-8', 'replace').strip()
+
+
+def _detect(system, uname):
+    '''
+    Build the ``PlatformInfo`` of the host, running ``zonename`` on SmartOS
+    '''
+    sunos = system.startswith('sunos')
+    smartos = sunos and uname is not None and uname[3].startswith('joyent_')
+    globalzone = zone = False
+    if smartos:
+        zonename = _zonename()
+        if zonename is not None:
+            globalzone = zonename == 'global'
+            zone = not globalzone
+    return PlatformInfo(
+        system=system,
+        uname=uname,
+        windows=system.startswith('win'),
+        linux=system.startswith('linux'),
+        darwin=system.startswith('darwin'),
+        sunos=sunos,
+        smartos=smartos,
+        smartos_globalzone=globalzone,
+        smartos_zone=zone,
+        freebsd=system.startswith('freebsd'),
+        netbsd=system.startswith('netbsd'),
+        openbsd=system.startswith('openbsd'),
+        aix=system.startswith('aix'),
+    )
+
+
+def _get_platform_info(refresh=False):
+    system = sys.platform
+    uname = _get_uname()
+    if not system.startswith('sunos'):
+        # Nothing requires a subprocess
+        return _detect(system, uname)
+    path = _cache_path()
+    if path is None:
+        return _detect(system, uname)
+    info = None if refresh else _load_cache(path, system, uname)
+    if info is None:
+        info = _detect(system, uname)
+        if not info.smartos or info.smartos_globalzone or info.smartos_zone:
+            # zonename didn't fail
+            _save_cache(path, info)
+    return info
+
+
+def get_platform_info(refresh=False):
+    '''
+    Return the ``PlatformInfo`` snapshot of the host, detecting it on the
+    first call.
+
+    Detection which needs a subprocess (``zonename`` on SmartOS) is stored
+    in the runtime directory and reused by the next runs as long as the
+    kernel is the same. Pass ``refresh=True`` to detect everything again.
+    '''
+    global _PLATFORM_INFO  # pylint: disable=global-statement
+    info = _PLATFORM_INFO
+    if info is not None and not refresh:
+        return info
+    with _PLATFORM_INFO_LOCK:
+        if _PLATFORM_INFO is None or refresh:
+            _PLATFORM_INFO = _get_platform_info(refresh)
+        return _PLATFORM_INFO
 
 
-@real_memoize
 def is_windows():
     '''
     Simple function to return if a host is Windows or not
     '''
-    return sys.platform.startswith('win')
+    return get_platform_info().windows
 
 
-@real_memoize
 def is_linux():
     '''
     Simple function to return if a host is Linux or not.
     Note for a proxy minion, we need to return something else
     '''
-    return sys.platform.startswith('linux')
+    return get_platform_info().linux
 
 
-@real_memoize
 def is_darwin():
     '''
     Simple function to return if a host is Darwin (macOS) or not
     '''
-    return sys.platform.startswith('darwin')
+    return get_platform_info().darwin
 
 
-@real_memoize
 def is_sunos():
     '''
     Simple function to return if host is SunOS or not
     '''
-    return sys.platform.startswith('sunos')
+    return get_platform_info().sunos
 
 
-@real_memoize
 def is_smartos():
     '''
     Simple function to return if host is SmartOS (Illumos) or not
     '''
-    if not is_sunos():
-        return False
-    else:
-        return os.uname()[3].startswith('joyent_')
+    return get_platform_info().smartos
 
 
-@real_memoize
 def is_smartos_globalzone():
     '''
     Function to return if host is SmartOS (Illumos) global zone or not
     '''
-    if not is_smartos():
-        return False
-    else:
-        cmd = ['zonename']
-        try:
-            zonename = subprocess.Popen(
-                cmd, shell=False,
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        except OSError:
-            return False
-        if zonename.returncode:
-            return False
-        if zonename.stdout.read().strip() == 'global':
-            return True
-
-        return False
+    return get_platform_info().smartos_globalzone
 
 
-@real_memoize
 def is_smartos_zone():
     '''
     Function to return if host is SmartOS (Illumos) and not the gz
     '''
-    if not is_smartos():
-        return False
-    else:
-        cmd = ['zonename']
-        try:
-            zonename = subprocess.Popen(
-                cmd, shell=False,
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        except OSError:
-            return False
-        if zonename.returncode:
-            return False
-        if zonename.stdout.read().strip() == 'global':
-            return False
-
-        return True
+    return get_platform_info().smartos_zone
 
 
-@real_memoize
 def is_freebsd():
     '''
     Simple function to return if host is FreeBSD or not
     '''
-    return sys.platform.startswith('freebsd')
+    return get_platform_info().freebsd
 
 
-@real_memoize
 def is_netbsd():
     '''
     Simple function to return if host is NetBSD or not
     '''
-    return sys.platform.startswith('netbsd')
+    return get_platform_info().netbsd
 
 
-@real_memoize
 def is_openbsd():
     '''
     Simple function to return if host is OpenBSD or not
     '''
-    return sys.platform.startswith('openbsd')
+    return get_platform_info().openbsd
 
 
-@real_memoize
 def is_aix():
     '''
     Simple function to return if host is AIX or not
     '''
-    return sys.platform.startswith('aix')
+    return get_platform_info().aix
@@ -4,51 +4,89 @@ Functions for daemonizing and modifying running processes
 
 # Python libs
 from __future__ import absolute_import, print_function, unicode_literals
+import collections
 import copy
+import gc
+import importlib
 import os
 import sys
 import time
 import errno
-import types
 import signal
 import logging
 import threading
-import contextlib
-import subprocess
-import multiprocessing
-import multiprocessing.util
-import socket
+
+# Import slacker libs
+import slacker.defaults.exitcodes
 
 # Import 3rd party libs
-from salt.ext import six
-from salt.ext.six.moves import queue, range
-from tornado import gen
+from slacker.ext import six
+from slacker.ext.six.moves import queue, range
 
 
 log = logging.getLogger(__name__)
 
-HAS_PSUTIL = False
-try:
-    import psutil
-    HAS_PSUTIL = True
-except ImportError:
-    pass
+# Optional and heavy modules (psutil, setproctitle, subprocess,
+# multiprocessing, json) are only imported when first needed, so that short
+# lived processes importing this module don't pay for them
+_LAZY_MODULES = {}
 
-try:
-    import setproctitle
-    HAS_SETPROCTITLE = True
-except ImportError:
-    HAS_SETPROCTITLE = False
+
+def _lazy_import(name):
+    '''
+    Import and return the module ``name``, or None if it isn't installed
+    '''
+    try:
+        return _LAZY_MODULES[name]
+    except KeyError:
+        pass
+    try:
+        module = importlib.import_module(name)
+    except ImportError:
+        module = None
+    _LAZY_MODULES[name] = module
+    return module
+
+
+def __getattr__(name):
+    '''
+    Compute ``HAS_PSUTIL`` and ``HAS_SETPROCTITLE`` on first access (Python
+    3.7+)
+    '''
+    if name == 'HAS_PSUTIL':
+        return _lazy_import('psutil') is not None
+    if name == 'HAS_SETPROCTITLE':
+        return _lazy_import('setproctitle') is not None
+    raise AttributeError(
+        'module {0!r} has no attribute {1!r}'.format(__name__, name)
+    )
+
+
+# Names appended to the title of this process, kept even when setproctitle
+# isn't available so that the process can still be identified
+_PROCTITLE_NAMES = []
 
 
 def appendproctitle(name):
     '''
     Append ``name`` to the current process title
     '''
-    if HAS_SETPROCTITLE:
+    _PROCTITLE_NAMES.append(name)
+    setproctitle = _lazy_import('setproctitle')
+    if setproctitle is not None:
         setproctitle.setproctitle(setproctitle.getproctitle() + ' ' + name)
 
 
+def getproctitle():
+    '''
+    Return the title of the current process
+    '''
+    setproctitle = _lazy_import('setproctitle')
+    if setproctitle is not None:
+        return setproctitle.getproctitle()
+    return ' '.join([os.path.basename(sys.argv[0])] + _PROCTITLE_NAMES)
+
+
 def daemonize(redirect_out=True):
     '''
     Daemonize process
@@ -79,4 +117,763 @@ def daemonize(redirect_out=True):
             os.dup2(dev_null.fileno(), sys.stderr.fileno())
             os.dup2(dev_null.fileno(), 0)
             os.dup2(dev_null.fileno(), 1)
-            os.dup2(dev_null.fileno(), 2)
\ No newline at end of file
+            os.dup2(dev_null.fileno(), 2)
+
+
+# Maximum number of log records handled by the listener in one batch
+LOG_BATCH_SIZE = 256
+
+
+class LogQueueHandler(logging.Handler):
+    '''
+    Logging handler used in worker processes to send the records to a
+    ``LogQueueListener`` in the parent process
+    '''
+    def __init__(self, queue):
+        logging.Handler.__init__(self)
+        self.queue = queue
+
+    def prepare(self, record):
+        '''
+        Make the record picklable: merge the arguments into the message and
+        render the traceback, leaving the actual formatting to the listener
+        '''
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put(self.prepare(record))
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+
+def _emit_batch(handler, records):
+    '''
+    Emit ``records`` through ``handler``. Plain stream and file handlers get
+    all the records formatted and written at once, followed by a single
+    flush. Other handlers, including rotating ones whose ``emit()`` must
+    run for each record, handle them one by one.
+    '''
+    records = [record for record in records
+               if record.levelno >= handler.level and handler.filter(record)]
+    if not records:
+        return
+    if type(handler) not in (logging.StreamHandler, logging.FileHandler):
+        for record in records:
+            handler.handle(record)
+        return
+    terminator = getattr(handler, 'terminator', '\n')
+    handler.acquire()
+    try:
+        if getattr(handler, 'stream', None) is None:
+            # Delayed FileHandler
+            handler.stream = handler._open()  # pylint: disable=protected-access
+        handler.stream.write(
+            ''.join(handler.format(record) + terminator for record in records)
+        )
+        handler.flush()
+    except Exception:  # pylint: disable=broad-except
+        handler.handleError(records[0])
+    finally:
+        handler.release()
+
+
+class LogQueueListener(object):
+    '''
+    Thread receiving the log records sent by worker processes through a
+    multiprocessing queue and handing them over to ``handlers``, the root
+    logger's handlers by default, in batches of up to ``batch_size``.
+    '''
+    _sentinel = None
+
+    def __init__(self, queue=None, handlers=None, batch_size=LOG_BATCH_SIZE):
+        if queue is None:
+            import multiprocessing
+            queue = multiprocessing.Queue()
+        self.queue = queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._thread = None
+
+    def _get_handlers(self):
+        if self.handlers is not None:
+            return self.handlers
+        return logging.getLogger().handlers
+
+    def _get_batch(self):
+        records = [self.queue.get()]
+        while len(records) < self.batch_size:
+            try:
+                records.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return records
+
+    def _monitor(self):
+        running = True
+        while running:
+            try:
+                records = self._get_batch()
+            except (EOFError, OSError):
+                break
+            if self._sentinel in records:
+                records = records[:records.index(self._sentinel)]
+                running = False
+            for handler in self._get_handlers():
+                _emit_batch(handler, records)
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._monitor, name='LogQueueListener'
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''
+        Handle the records still in the queue and stop the thread
+        '''
+        if self._thread is None:
+            return
+        self.queue.put(self._sentinel)
+        self._thread.join()
+        self._thread = None
+
+
+def setup_mp_logging_listener(handlers=None, batch_size=LOG_BATCH_SIZE):
+    '''
+    Start a ``LogQueueListener`` in this process and return it. Workers
+    pass its ``queue`` to ``setup_mp_logging_client``.
+    '''
+    listener = LogQueueListener(handlers=handlers, batch_size=batch_size)
+    listener.start()
+    return listener
+
+
+def setup_mp_logging_client(log_queue, level=logging.DEBUG):
+    '''
+    Replace the root logger's handlers in a worker process with one sending
+    the records to the listener reading ``log_queue``
+    '''
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(LogQueueHandler(log_queue))
+    root.setLevel(level)
+
+
+def _get_mp_context():
+    '''
+    Return the multiprocessing context used to spawn workers, preferring
+    ``fork`` so preloaded modules are shared copy-on-write
+    '''
+    import multiprocessing
+
+    get_context = getattr(multiprocessing, 'get_context', None)
+    if get_context is None:
+        return multiprocessing
+    try:
+        return get_context('fork')
+    except ValueError:
+        return get_context()
+
+
+def _run_worker(name, tgt, args, kwargs, log_queue=None):
+    '''
+    Entry point of the processes started by ``ProcessManager``
+    '''
+    # Don't run the manager's signal handlers in the workers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    if log_queue is not None:
+        setup_mp_logging_client(log_queue, logging.getLogger().level)
+    appendproctitle(name)
+    tgt(*args, **kwargs)
+
+
+class ProcessManager(object):
+    '''
+    Spawn and supervise worker processes.
+
+    Workers exiting with a non zero code are restarted. A worker which
+    crashes again shortly after being started waits twice as long as the
+    previous time before being restarted, up to ``max_restart_delay``
+    seconds. ``run()`` supervises the workers until SIGTERM or SIGINT is
+    received, then stops them.
+
+    ``preload`` is a list of modules imported before the first worker is
+    forked, so their memory is shared copy-on-write with all the workers.
+    With ``freeze_gc`` the garbage collector is disabled while they are
+    imported and the objects alive in the manager are frozen with
+    ``gc.freeze()`` while forking, so collections in the workers don't
+    write to, and copy, the shared pages. They are unfrozen again in the
+    manager right after forking.
+
+    If ``log_queue`` is passed, see ``setup_mp_logging_listener``, the
+    workers send their log records to it.
+    '''
+    def __init__(self, name=None, wait_for_kill=1, max_restart_delay=60,
+                 preload=None, log_queue=None, freeze_gc=False):
+        self.name = name or self.__class__.__name__
+        self.wait_for_kill = wait_for_kill
+        self.max_restart_delay = max_restart_delay
+        self.preload = list(preload or [])
+        # gc.freeze() is Python 3.7+
+        self.freeze_gc = freeze_gc and hasattr(gc, 'freeze')
+        self.log_queue = log_queue
+        self._process_map = {}
+        self._restart_processes = True
+        self._shutdown = False
+        self._preloaded = False
+        self._context = _get_mp_context()
+
+    def _preload(self):
+        '''
+        Import the heavy modules once in the manager before forking
+        '''
+        if self._preloaded:
+            return
+        gc_enabled = gc.isenabled()
+        if self.freeze_gc:
+            # Collecting while importing leaves freed holes in the pages
+            # which are about to be shared
+            gc.disable()
+        try:
+            for module in self.preload:
+                try:
+                    __import__(module)
+                except ImportError as exc:
+                    log.warning('Unable to preload %s: %s', module, exc)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self._preloaded = True
+
+    def _start(self, data):
+        process = self._context.Process(
+            target=_run_worker,
+            args=(data['name'], data['tgt'], data['args'], data['kwargs'],
+                  self.log_queue),
+            name=data['name'],
+        )
+        if self.freeze_gc:
+            # Only the worker keeps these objects frozen, the manager
+            # unfreezes them once forked
+            gc.freeze()
+        try:
+            process.start()
+        finally:
+            if self.freeze_gc:
+                gc.unfreeze()
+        data['Process'] = process
+        data['started'] = time.time()
+        data['restart_at'] = None
+        self._process_map[process.pid] = data
+        log.debug('Started \'%s\' with pid %s', data['name'], process.pid)
+        return process
+
+    def add_process(self, tgt, args=None, kwargs=None, name=None):
+        '''
+        Start a worker process running ``tgt(*args, **kwargs)``
+        '''
+        self._preload()
+        if name is None:
+            name = '{0}-{1}'.format(self.name, getattr(tgt, '__name__', tgt))
+        return self._start({
+            'tgt': tgt,
+            'args': tuple(args or ()),
+            'kwargs': dict(kwargs or {}),
+            'name': name,
+            'delay': 0,
+        })
+
+    def add_workers(self, tgt, count=None, args=None, kwargs=None, name=None):
+        '''
+        Start ``count`` worker processes running ``tgt``, one per CPU by
+        default
+        '''
+        if count is None:
+            import multiprocessing
+            count = multiprocessing.cpu_count()
+        name = name or '{0}-{1}'.format(self.name, getattr(tgt, '__name__', tgt))
+        return [
+            self.add_process(tgt, args, kwargs, '{0}-{1}'.format(name, idx))
+            for idx in range(count)
+        ]
+
+    def restart_process(self, pid):
+        '''
+        Start the worker which ran as ``pid`` again
+        '''
+        data = self._process_map.pop(pid)
+        log.info(
+            'Process %s (%s) died with exit status %s, restarting...',
+            data['name'], pid, data['Process'].exitcode
+        )
+        data['Process'].join(0)
+        return self._start(data)
+
+    def _schedule_restart(self, data):
+        uptime = time.time() - data['started']
+        if uptime > self.max_restart_delay:
+            # Ran long enough, it didn't crash right away
+            data['delay'] = 0
+        else:
+            data['delay'] = min(max(data['delay'] * 2, 1),
+                                self.max_restart_delay)
+        data['restart_at'] = time.time() + data['delay']
+
+    def check_children(self):
+        '''
+        Reap the workers which exited and restart the crashed ones once their
+        backoff delay expired
+        '''
+        now = time.time()
+        for pid, data in list(six.iteritems(self._process_map)):
+            process = data['Process']
+            if process.is_alive():
+                continue
+            if process.exitcode == slacker.defaults.exitcodes.EX_OK \
+                    or not self._restart_processes:
+                log.debug('Process %s (%s) exited', data['name'], pid)
+                process.join(0)
+                del self._process_map[pid]
+            elif data['restart_at'] is None:
+                self._schedule_restart(data)
+            elif now >= data['restart_at']:
+                self.restart_process(pid)
+
+    def stop_restarting(self):
+        self._restart_processes = False
+
+    def worker_titles(self):
+        '''
+        Return a dict mapping the pid of each worker to its name, suitable
+        for the ``pids`` argument of ``ResourceSampler``
+        '''
+        return dict(
+            (pid, data['name']) for pid, data in six.iteritems(self._process_map)
+        )
+
+    def _handle_signals(self, signum, frame):  # pylint: disable=unused-argument
+        log.debug('%s received signal %s, shutting down', self.name, signum)
+        self._shutdown = True
+        self.stop_restarting()
+
+    def kill_children(self):
+        '''
+        Terminate all the workers, killing the ones which are still running
+        after ``wait_for_kill`` seconds
+        '''
+        self.stop_restarting()
+        for data in six.itervalues(self._process_map):
+            if data['Process'].is_alive():
+                data['Process'].terminate()
+        end_time = time.time() + self.wait_for_kill
+        for data in six.itervalues(self._process_map):
+            data['Process'].join(max(end_time - time.time(), 0))
+        for pid, data in six.iteritems(self._process_map):
+            if data['Process'].is_alive():
+                log.warning('Process %s (%s) did not stop, killing it',
+                            data['name'], pid)
+                try:
+                    os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+                except OSError as exc:
+                    if exc.errno != errno.ESRCH:
+                        raise
+                data['Process'].join(1)
+        self._process_map.clear()
+
+    def run(self, interval=1):
+        '''
+        Supervise the workers until SIGTERM or SIGINT is received or all of
+        them exited cleanly, then stop them
+        '''
+        appendproctitle(self.name)
+        signal.signal(signal.SIGTERM, self._handle_signals)
+        signal.signal(signal.SIGINT, self._handle_signals)
+        try:
+            while not self._shutdown and self._process_map:
+                self.check_children()
+                time.sleep(interval)
+        finally:
+            self.kill_children()
+
+
+# Default maximum number of commands run at the same time by run_command()
+COMMAND_CONCURRENCY = 16
+
+# Size of the reads done on the output pipes of commands
+COMMAND_CHUNK_SIZE = 65536
+
+# Resolved executable paths, see CommandRunner._resolve()
+_EXECUTABLES = {}
+
+
+class CommandOutput(object):
+    '''
+    Iterator over the output of a command started by
+    ``CommandRunner.stream``. ``returncode`` is set once it is exhausted.
+    '''
+    def __init__(self, runner, cmd, timeout, lines, env, cwd):
+        self.cmd = cmd
+        self.returncode = None
+        self._output = runner._stream(self, cmd, timeout, lines, env, cwd)  # pylint: disable=protected-access
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._output)
+
+    next = __next__
+
+    def close(self):
+        '''
+        Stop reading the output, killing the command if still running
+        '''
+        self._output.close()
+
+
+class CommandRunner(object):
+    '''
+    Run commands with at most ``max_concurrency`` of them running at the
+    same time, streaming their output.
+
+    Executables are resolved to absolute paths and the commands spawned
+    without closing file descriptors (Python's are not inheritable anyway),
+    which lets ``subprocess`` use ``posix_spawn`` instead of fork+exec when
+    available.
+    '''
+    def __init__(self, max_concurrency=COMMAND_CONCURRENCY, timeout=None,
+                 chunk_size=COMMAND_CHUNK_SIZE):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+    @staticmethod
+    def _resolve(cmd):
+        '''
+        Return ``cmd`` with its executable replaced by its absolute path
+        '''
+        executable = cmd[0]
+        if os.path.isabs(executable):
+            return cmd
+        try:
+            path = _EXECUTABLES[executable]
+        except KeyError:
+            try:
+                from shutil import which
+            except ImportError:
+                from distutils.spawn import find_executable as which
+            path = _EXECUTABLES[executable] = which(executable) or executable
+        return [path] + list(cmd[1:])
+
+    def _spawn(self, cmd, env=None, cwd=None):
+        import subprocess
+
+        kwargs = {
+            'stdin': open(os.devnull, 'rb'),
+            'stdout': subprocess.PIPE,
+            'stderr': subprocess.PIPE,
+            'env': env,
+        }
+        if cwd is None and six.PY3:
+            kwargs['close_fds'] = False
+        else:
+            kwargs['cwd'] = cwd
+        try:
+            return subprocess.Popen(self._resolve(cmd), **kwargs)
+        finally:
+            kwargs['stdin'].close()
+
+    def stream(self, cmd, timeout=None, lines=True, env=None, cwd=None):
+        '''
+        Run ``cmd``, a list of arguments, and return a ``CommandOutput``
+        iterator yielding ``(name, data)`` tuples as output is produced,
+        ``name`` being ``stdout`` or ``stderr`` and ``data`` a line (when
+        ``lines`` is True) or a chunk of bytes. Output is read through a
+        selector, nothing is buffered besides incomplete lines.
+
+        If the command runs longer than ``timeout`` seconds it is killed
+        and ``subprocess.TimeoutExpired`` raised.
+        '''
+        return CommandOutput(self, cmd, timeout, lines, env, cwd)
+
+    def _stream(self, output, cmd, timeout, lines, env, cwd):
+        import selectors
+        import subprocess
+
+        if timeout is None:
+            timeout = self.timeout
+        self._semaphore.acquire()
+        proc = None
+        try:
+            proc = self._spawn(cmd, env, cwd)
+            deadline = None if timeout is None else time.time() + timeout
+            pending = {'stdout': b'', 'stderr': b''}
+            selector = selectors.DefaultSelector()
+            selector.register(proc.stdout, selectors.EVENT_READ, 'stdout')
+            selector.register(proc.stderr, selectors.EVENT_READ, 'stderr')
+            try:
+                while selector.get_map():
+                    wait = None
+                    if deadline is not None:
+                        wait = deadline - time.time()
+                        if wait <= 0:
+                            raise subprocess.TimeoutExpired(cmd, timeout)
+                    for key, _ in selector.select(wait):
+                        data = os.read(key.fd, self.chunk_size)
+                        if not data:
+                            selector.unregister(key.fileobj)
+                            if pending[key.data]:
+                                yield key.data, pending[key.data]
+                            continue
+                        if not lines:
+                            yield key.data, data
+                            continue
+                        data = pending[key.data] + data
+                        parts = data.split(b'\n')
+                        pending[key.data] = parts.pop()
+                        for part in parts:
+                            yield key.data, part + b'\n'
+            finally:
+                selector.close()
+            remaining = None if deadline is None else max(deadline - time.time(), 0)
+            proc.wait(remaining)
+        finally:
+            if proc is not None:
+                if proc.poll() is None:
+                    proc.kill()
+                # Always reap the child
+                output.returncode = proc.wait()
+                proc.stdout.close()
+                proc.stderr.close()
+            self._semaphore.release()
+
+    def run(self, cmd, timeout=None, env=None, cwd=None):
+        '''
+        Run ``cmd`` and return a ``(returncode, stdout, stderr)`` tuple
+        '''
+        out = {'stdout': [], 'stderr': []}
+        output = self.stream(cmd, timeout, lines=False, env=env, cwd=cwd)
+        for name, data in output:
+            out[name].append(data)
+        return output.returncode, b''.join(out['stdout']), b''.join(out['stderr'])
+
+
+_COMMAND_RUNNER = None
+
+
+def get_command_runner():
+    '''
+    Return the process wide ``CommandRunner`` enforcing the global
+    concurrency limit
+    '''
+    global _COMMAND_RUNNER  # pylint: disable=global-statement
+    if _COMMAND_RUNNER is None:
+        _COMMAND_RUNNER = CommandRunner()
+    return _COMMAND_RUNNER
+
+
+def run_command(cmd, timeout=None, env=None, cwd=None):
+    '''
+    Run ``cmd`` with the process wide runner, see ``CommandRunner.run``
+    '''
+    return get_command_runner().run(cmd, timeout, env, cwd)
+
+
+# Number of samples kept by ResourceSampler by default
+RESOURCE_SAMPLES_SIZE = 1024
+
+# Prometheus metrics exported by ResourceSampler.to_prometheus(), as
+# (sample key, metric name, metric type, help)
+_PROMETHEUS_METRICS = (
+    ('cpu_percent', 'slacker_process_cpu_percent', 'gauge',
+     'CPU utilization of the process'),
+    ('cpu_user', 'slacker_process_cpu_user_seconds_total', 'counter',
+     'User CPU time'),
+    ('cpu_system', 'slacker_process_cpu_system_seconds_total', 'counter',
+     'System CPU time'),
+    ('rss', 'slacker_process_resident_memory_bytes', 'gauge',
+     'Resident set size'),
+    ('num_fds', 'slacker_process_open_fds', 'gauge',
+     'Number of open file descriptors'),
+    ('ctx_switches_voluntary', 'slacker_process_voluntary_ctx_switches_total',
+     'counter', 'Voluntary context switches'),
+    ('ctx_switches_involuntary',
+     'slacker_process_involuntary_ctx_switches_total', 'counter',
+     'Involuntary context switches'),
+    ('io_read_bytes', 'slacker_process_io_read_bytes_total', 'counter',
+     'Bytes read'),
+    ('io_write_bytes', 'slacker_process_io_write_bytes_total', 'counter',
+     'Bytes written'),
+    ('io_read_count', 'slacker_process_io_read_total', 'counter',
+     'Read operations'),
+    ('io_write_count', 'slacker_process_io_write_total', 'counter',
+     'Write operations'),
+)
+
+
+def _prometheus_label(value):
+    return six.text_type(value).replace('\\', '\\\\') \
+        .replace('"', '\\"').replace('\n', '\\n')
+
+
+class ResourceSampler(object):
+    '''
+    Periodically record the resource usage of processes into a ring buffer
+    of the last ``size`` samples. Requires psutil.
+
+    pids
+        The processes to sample. Either a dict mapping pids to titles, an
+        iterable of pids or a callable returning one of those, e.g.
+        ``ProcessManager.worker_titles``. Defaults to this process and all
+        its children. Processes without a given title are tagged with
+        their command line, which includes the names added by
+        ``appendproctitle``.
+    '''
+    def __init__(self, interval=10, size=RESOURCE_SAMPLES_SIZE, pids=None):
+        self._psutil = _lazy_import('psutil')
+        if self._psutil is None:
+            raise ImportError('psutil is required to sample resource usage')
+        self.interval = interval
+        self.pids = pids
+        self.samples = collections.deque(maxlen=size)
+        self._procs = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _targets(self):
+        pids = self.pids() if callable(self.pids) else self.pids
+        if pids is None:
+            current = self._psutil.Process()
+            pids = dict([(current.pid, getproctitle())] + [
+                (child.pid, None) for child in current.children(recursive=True)
+            ])
+        if not isinstance(pids, dict):
+            pids = dict((pid, None) for pid in pids)
+        return pids
+
+    def _sample_process(self, pid, title, now):
+        proc = self._procs.get(pid)
+        if proc is None:
+            proc = self._procs[pid] = self._psutil.Process(pid)
+            # The first call only sets the reference point
+            proc.cpu_percent(None)
+        with proc.oneshot():
+            if title is None:
+                title = ' '.join(proc.cmdline()) or proc.name()
+            cpu_times = proc.cpu_times()
+            ctx = proc.num_ctx_switches()
+            sample = {
+                'time': now,
+                'pid': pid,
+                'title': title,
+                'cpu_percent': proc.cpu_percent(None),
+                'cpu_user': cpu_times.user,
+                'cpu_system': cpu_times.system,
+                'rss': proc.memory_info().rss,
+                'ctx_switches_voluntary': ctx.voluntary,
+                'ctx_switches_involuntary': ctx.involuntary,
+            }
+            if hasattr(proc, 'num_fds'):
+                sample['num_fds'] = proc.num_fds()
+            try:
+                io = proc.io_counters()
+            except (AttributeError, self._psutil.AccessDenied):
+                pass
+            else:
+                sample['io_read_bytes'] = io.read_bytes
+                sample['io_write_bytes'] = io.write_bytes
+                sample['io_read_count'] = io.read_count
+                sample['io_write_count'] = io.write_count
+        return sample
+
+    def sample(self):
+        '''
+        Take one sample of every target process, store and return them
+        '''
+        now = time.time()
+        targets = self._targets()
+        ret = []
+        for pid, title in six.iteritems(targets):
+            try:
+                ret.append(self._sample_process(pid, title, now))
+            except (self._psutil.NoSuchProcess, self._psutil.ZombieProcess):
+                self._procs.pop(pid, None)
+            except self._psutil.AccessDenied as exc:
+                log.debug('Unable to sample process %s: %s', pid, exc)
+        # Forget the processes which went away
+        for pid in set(self._procs) - set(targets):
+            del self._procs[pid]
+        with self._lock:
+            self.samples.extend(ret)
+        return ret
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except Exception:  # pylint: disable=broad-except
+                log.exception('Failed to sample resource usage')
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='ResourceSampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def latest(self):
+        '''
+        Return the most recent sample of each process
+        '''
+        ret = {}
+        with self._lock:
+            for sample in self.samples:
+                ret[sample['pid']] = sample
+        return list(ret.values())
+
+    def to_json(self):
+        '''
+        Dump all the samples in the buffer as JSON
+        '''
+        import json
+
+        with self._lock:
+            return json.dumps(list(self.samples))
+
+    def to_prometheus(self):
+        '''
+        Dump the most recent sample of each process in the Prometheus text
+        exposition format
+        '''
+        latest = self.latest()
+        lines = []
+        for key, name, metric_type, doc in _PROMETHEUS_METRICS:
+            values = [sample for sample in latest if key in sample]
+            if not values:
+                continue
+            lines.append('# HELP {0} {1}'.format(name, doc))
+            lines.append('# TYPE {0} {1}'.format(name, metric_type))
+            for sample in values:
+                lines.append('{0}{{pid="{1}",title="{2}"}} {3}'.format(
+                    name, sample['pid'], _prometheus_label(sample['title']),
+                    sample[key]
+                ))
+        return '\n'.join(lines) + '\n'
@@ -5,25 +5,89 @@ Functions for manipulating or processing strings
 # Python libs
 from __future__ import absolute_import, print_function, unicode_literals
 import base64
+import binascii
 import errno
 import fnmatch
+import locale
 import logging
+import mmap
 import os
-import shlex
 import re
+import sys
+import threading
 import time
 import unicodedata
 
 # Salt libs
-from salt.utils.decorators.jinja import jinja_filter
+from slacker.utils.decorators import bounded_memoize
+from slacker.utils.decorators.jinja import jinja_filter
 
 # 3rd-part libs
-from salt.ext import six
-from salt.ext.six.moves import range
+from slacker.ext import six
+from slacker.ext.six.moves import range
 
 log = logging.getLogger(__name__)
 
 
+def _get_system_encoding():
+    '''
+    Detect the encoding used by the system, used as a fallback when strings
+    can't be handled as UTF-8
+    '''
+    try:
+        encoding = locale.getpreferredencoding(False)
+    except Exception:  # pylint: disable=broad-except
+        encoding = None
+    return encoding or sys.getdefaultencoding()
+
+
+# Resolved once at import time
+SYSTEM_ENCODING = _get_system_encoding()
+
+# Characters which make an expression a glob or a regular expression rather
+# than a plain string
+_EXPR_SPECIAL_CHARS = frozenset('.*?[]{}()|\\+^$')
+
+# Constructs which can't be safely merged with other expressions into a
+# single alternation: named groups, numbered backreferences and conditional
+# group references
+_EXPR_STANDALONE_RE = re.compile(r'\(\?P|\\[1-9]|\(\?\(')
+
+# Number of matchers cached by Matcher.compile()
+MATCHER_CACHE_SIZE = 256
+
+# Characters considered text by is_binary(), and the tables used to strip
+# them from unicode and byte strings
+_TEXT_CHARACTERS = ''.join(
+    [chr(x) for x in range(32, 127)] + list('\n\r\t\b')
+)
+_TEXT_BYTES = _TEXT_CHARACTERS.encode('ascii')
+_TEXT_TRANS = dict((ord(x), None) for x in _TEXT_CHARACTERS)
+
+# Number of bytes read from a file to decide whether it is binary
+BINARY_SNIFF_SIZE = 8192
+
+# Tokenizers used by build_whitespace_split_regex()
+_WS_TOKEN_RE = re.compile(r'[^ \t\r\n]+')
+_WS_QUOTED_TOKEN_RE = re.compile(r'"[^"]*"|"|[^ \t\r\n"][^ \t\r\n]*')
+
+# Number of expressions cached by compile_whitespace_split_regex()
+WS_REGEX_CACHE_SIZE = 256
+
+# Size suffixes understood by parse_size(), in increasing powers
+_SIZE_PREFIXES = 'KMGTPE'
+_SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d*)?|\.\d+)\s*([a-z]*)\s*$', re.IGNORECASE)
+
+# Number of random bytes drawn at once by TokenGenerator
+TOKEN_BUFFER_SIZE = 3072
+
+# Number of parsed sizes cached by split_size()
+SIZE_CACHE_SIZE = 1024
+
+# Number of automatons cached by AhoCorasick.compile()
+AHO_CORASICK_CACHE_SIZE = 64
+
+
 @jinja_filter('to_bytes')
 def to_bytes(s, encoding=None, errors='strict'):
     '''
@@ -41,8 +105,8 @@ def to_bytes(s, encoding=None, errors='strict'):
             else:
                 try:
                     return s.encode('utf-8', errors)
-                except UnicodeDecodeError:
-                    return s.encode(__salt_system_encoding__, errors)
+                except UnicodeEncodeError:
+                    return s.encode(SYSTEM_ENCODING, errors)
         raise TypeError('expected bytes, bytearray or str')
     else:
         return to_str(s, encoding, errors)
@@ -69,7 +133,7 @@ def to_str(s, encoding=None, errors='strict', normalize=False):
                     return _normalize(s.decode('utf-8', errors))
                 except UnicodeDecodeError:
                     # Fall back to system detected encoding
-                    return _normalize(s.decode(__salt_system_encoding__, errors))
+                    return _normalize(s.decode(SYSTEM_ENCODING, errors))
         raise TypeError('expected str, bytes or bytearray not {}'.format(type(s)))
     else:
         if isinstance(s, bytearray):
@@ -80,8 +144,8 @@ def to_str(s, encoding=None, errors='strict', normalize=False):
             else:
                 try:
                     return _normalize(s).encode('utf-8', errors)
-                except UnicodeDecodeError:
-                    return _normalize(s).encode(__salt_system_encoding__, errors)
+                except UnicodeEncodeError:
+                    return _normalize(s).encode(SYSTEM_ENCODING, errors)
         raise TypeError('expected str, bytearray or unicode')
 
 
@@ -105,7 +169,7 @@ def to_unicode(s, encoding=None, errors='strict', normalize=False):
             if encoding:
                 return _normalize(s.decode(encoding, errors))
             else:
-                return _normalize(s.decode(__salt_system_encoding__, errors))
+                return _normalize(s.decode(SYSTEM_ENCODING, errors))
         raise TypeError('expected str or bytearray not {}'.format(type(s)))
 
 
@@ -177,39 +241,137 @@ def is_binary(data):
     if not data or not isinstance(data, (six.string_types, six.binary_type)):
         return False
 
-    try:
-        if isinstance(data, six.binary_type):
-            if b'\0' in data:
-                return True
-        elif str('\0') in data:
+    if isinstance(data, six.binary_type):
+        if b'\0' in data:
             return True
-    except UnicodeDecodeError:
-        pass
-
-    text_characters = ''.join([chr(x) for x in range(32, 127)] + list('\n\r\t\b'))
-    if six.PY3:
-        if isinstance(data, six.binary_type):
-            import salt.utils.data
-            nontext = data.translate(None, salt.utils.data.encode(text_characters))
-        else:
-            trans = ''.maketrans('', '', text_characters)
-            nontext = data.translate(trans)
+        nontext = data.translate(None, _TEXT_BYTES)
     else:
-        if isinstance(data, six.text_type):
-            trans_args = ({ord(x): None for x in text_characters},)
-        else:
-            trans_args = (None, str(text_characters))
-        nontext = data.translate(*trans_args)
+        if '\0' in data:
+            return True
+        nontext = data.translate(_TEXT_TRANS)
 
     if float(len(nontext)) / len(data) > 0.30:
         return True
     return False
 
 
+def is_binary_many(buffers):
+    '''
+    Run ``is_binary`` on each item of ``buffers`` and return the list of
+    results
+    '''
+    return [is_binary(data) for data in buffers]
+
+
+def is_binary_stream(stream, sniff_size=BINARY_SNIFF_SIZE):
+    '''
+    Detect if a file object holds binary data by reading at most
+    ``sniff_size`` bytes (or characters for text mode files) from its current
+    position. Text mode files which can't be decoded are considered binary.
+    '''
+    try:
+        data = stream.read(sniff_size)
+    except UnicodeDecodeError:
+        return True
+    return is_binary(data)
+
+
+def is_binary_files(paths, sniff_size=BINARY_SNIFF_SIZE):
+    '''
+    Detect which of the files in ``paths`` are binary, only reading the
+    first ``sniff_size`` bytes of each. Returns a dict mapping each path to
+    the result, unreadable files are reported as not binary.
+    '''
+    ret = {}
+    for path in paths:
+        try:
+            with open(path, 'rb') as stream:
+                ret[path] = is_binary_stream(stream, sniff_size)
+        except (IOError, OSError) as exc:
+            log.debug('Unable to read %s: %s', path, exc)
+            ret[path] = False
+    return ret
+
+
+class TokenGenerator(object):
+    '''
+    Generate random tokens from a buffer of random characters which is
+    refilled from ``os.urandom`` in bulk, instead of drawing and encoding
+    entropy for every token.
+
+    ``alphabet`` is one of ``base64``, ``urlsafe`` (base64 with ``-`` and
+    ``_`` instead of ``+`` and ``/``) or ``hex``. Every character of the
+    alphabet is equally likely. The buffer is dropped after a fork so a
+    child process never hands out the same tokens as its parent.
+    '''
+    # Number of random bytes drawn at once, and the function encoding them
+    # into characters. Byte counts are multiples of 3 so base64 encoding
+    # never needs padding.
+    _ENCODERS = {
+        'base64': base64.b64encode,
+        'urlsafe': base64.urlsafe_b64encode,
+        'hex': binascii.hexlify,
+    }
+
+    def __init__(self, alphabet='urlsafe', buffer_size=TOKEN_BUFFER_SIZE):
+        try:
+            self._encode = self._ENCODERS[alphabet]
+        except KeyError:
+            raise ValueError('Unknown token alphabet \'{0}\''.format(alphabet))
+        self.alphabet = alphabet
+        self.buffer_size = buffer_size - buffer_size % 3 or 3
+        self._lock = threading.Lock()
+        self._chars = ''
+        self._pos = 0
+        self._pid = os.getpid()
+
+    def _take(self, count):
+        '''
+        Return ``count`` random characters, refilling the buffer if needed.
+        Must be called with the lock held.
+        '''
+        pid = os.getpid()
+        if pid != self._pid:
+            # Forked, don't share the parent's entropy
+            self._chars = ''
+            self._pos = 0
+            self._pid = pid
+        if self._pos + count > len(self._chars):
+            # Bytes needed to encode ``count`` characters, rounded up
+            needed = count // 2 + 3 if self.alphabet == 'hex' else count * 3 // 4 + 3
+            size = max(self.buffer_size, needed - needed % 3 + 3)
+            self._chars = self._chars[self._pos:] + \
+                self._encode(os.urandom(size)).decode('ascii')
+            self._pos = 0
+        ret = self._chars[self._pos:self._pos + count]
+        self._pos += count
+        return ret
+
+    def token(self, size=32):
+        '''
+        Return a random token of ``size`` characters
+        '''
+        with self._lock:
+            return self._take(size)
+
+    def tokens(self, count, size=32):
+        '''
+        Return a list of ``count`` random tokens of ``size`` characters
+        '''
+        with self._lock:
+            chars = self._take(count * size)
+        return [chars[idx:idx + size] for idx in range(0, count * size, size)]
+
+
+_TOKEN_GENERATOR = TokenGenerator('base64')
+
+
 @jinja_filter('random_str')
 def random(size=32):
-    key = os.urandom(size)
-    return to_unicode(base64.b64encode(key).replace(b'\n', b'')[:size])
+    '''
+    Return a random string of ``size`` base64 characters
+    '''
+    return _TOKEN_GENERATOR.token(size)
 
 
 @jinja_filter('contains_whitespace')
@@ -220,33 +382,96 @@ def contains_whitespace(text):
     return any(x.isspace() for x in text)
 
 
+def _size_table(si):
+    '''
+    Build the table mapping lowercase size suffixes to their multiplier.
+    IEC suffixes (KiB, Mi...) are always powers of 1024, plain ones (K, KB,
+    M, MB...) are powers of 1000 if ``si`` is True and of 1024 otherwise.
+    '''
+    table = {'': 1, 'b': 1}
+    for power, prefix in enumerate(_SIZE_PREFIXES, 1):
+        prefix = prefix.lower()
+        table[prefix] = table[prefix + 'b'] = (1000 if si else 1024) ** power
+        table[prefix + 'i'] = table[prefix + 'ib'] = 1024 ** power
+    return table
+
+
+_SIZE_TABLES = {False: _size_table(False), True: _size_table(True)}
+
+
+def split_size(size, si=False):
+    '''
+    Parse a human-readable size like ``2G``, ``1.5 MiB`` or ``300kB`` into a
+    ``(number, multiplier)`` tuple. Raises a ValueError if ``size`` can't be
+    parsed. See ``parse_size`` for the meaning of ``si``.
+    '''
+    return _split_size(size, bool(si))
+
+
+@bounded_memoize(SIZE_CACHE_SIZE)
+def _split_size(size, si):
+    match = _SIZE_RE.match(size)
+    if match is None:
+        raise ValueError('Invalid size: \'{0}\''.format(size))
+    number, suffix = match.groups()
+    try:
+        multiplier = _SIZE_TABLES[bool(si)][suffix.lower()]
+    except KeyError:
+        raise ValueError('Invalid size unit: \'{0}\''.format(size))
+    number = float(number) if '.' in number else int(number)
+    return number, multiplier
+
+
+def parse_size(size, si=False):
+    '''
+    Given a human-readable size (2G, 30M, 1.5GiB, 512 kB) return the number
+    of bytes. Units without the IEC ``i`` are powers of 1024 unless ``si`` is
+    True. Raises a ValueError if ``size`` can't be parsed.
+    '''
+    number, multiplier = split_size(size, si)
+    return int(number * multiplier)
+
+
+def bytes_to_human(size, si=False, precision=1):
+    '''
+    Format a number of bytes into a human-readable string, the inverse of
+    ``parse_size``. IEC suffixes (KiB, MiB...) are used unless ``si`` is
+    True, in which case the SI ones (kB, MB...) are.
+    '''
+    base = 1000 if si else 1024
+    value = float(size)
+    power = 0
+    while abs(value) >= base and power < len(_SIZE_PREFIXES):
+        value /= base
+        power += 1
+    if power == 0:
+        return '{0}B'.format(int(size))
+    ret = '{0:.{1}f}'.format(value, precision)
+    if abs(float(ret)) >= base and power < len(_SIZE_PREFIXES):
+        # Rounded up to the next unit, e.g. 1023.99KiB to 1024KiB
+        value /= base
+        power += 1
+        ret = '{0:.{1}f}'.format(value, precision)
+    prefix = _SIZE_PREFIXES[power - 1]
+    if si:
+        suffix = ('k' if prefix == 'K' else prefix) + 'B'
+    else:
+        suffix = prefix + 'iB'
+    if '.' in ret:
+        ret = ret.rstrip('0').rstrip('.')
+    return ret + suffix
+
+
 def human_to_bytes(size):
     '''
-    Given a human-readable byte string (2G, 30M)
+    Given a human-readable byte string (2G, 30M, 1.5GiB)
     return the number of bytes. Will return 0 if the argument has
     unexpected form.
     '''
-    if size[-1].upper() == 'B':
-        size = size[:-1]
-    sbytes = size[:-1]
-    unit =size[-1].upper()
-    if sbytes.isdigit():
-        sbytes = int(sbytes)
-        if unit == 'P':
-            sbytes *= 1125899906842624
-        elif unit == 'T':
-            sbytes *= 1099511627776
-        elif unit == 'G':
-            sbytes *= 1073741824
-        elif unit == 'M':
-            sbytes *= 1048576
-        elif unit == 'K':
-            sbytes *= 1024
-        else:
-            sbytes = 0
-    else:
-        sbytes = 0
-    return sbytes
+    try:
+        return parse_size(size)
+    except (TypeError, ValueError):
+        return 0
 
 
 def build_whitespace_split_regex(text):
@@ -259,8 +484,8 @@ def build_whitespace_split_regex(text):
     .. code-block:: python
 
         >>> import re
-        >>> import salt.utils.stringutils
-        >>> regex = salt.utils.stringutils.build_whitespace_split_regex(
+        >>> import slacker.utils.stringutils
+        >>> regex = slacker.utils.stringutils.build_whitespace_split_regex(
         ...     """if [ -z "$debian_chroot" ] && [ -r /etc/debian_chroot ]; then"""
         ... )
 
@@ -277,21 +502,71 @@ def build_whitespace_split_regex(text):
         >>>
 
     '''
-    def __build_parts(text):
-        lexer = shlex.shlex(text)
-        lexer.whitespace_split = True
-        lexer.commenters = ''
-        if '\'' in text:
-            lexer.quotes = '"'
-        elif '"' in text:
-            lexer.quotes = '\''
-        return list(lexer)
+    return r'(?m)^{0}$'.format(_whitespace_split_body(text))
+
 
+def _whitespace_split_tokens(line):
+    '''
+    Split a line the same way ``shlex`` does in non-POSIX mode with
+    ``whitespace_split`` set and double quotes only honoured when the line
+    contains a single quote, without the overhead of ``shlex``.
+    '''
+    if '\'' not in line:
+        return _WS_TOKEN_RE.findall(line)
+    tokens = _WS_QUOTED_TOKEN_RE.findall(line)
+    if '"' in tokens:
+        raise ValueError('No closing quotation')
+    return tokens
+
+
+def _whitespace_split_body(text):
     regex = r''
     for line in text.splitlines():
-        parts = [re.escape(s) for s in __build_parts(line)]
+        parts = [re.escape(s) for s in _whitespace_split_tokens(line)]
         regex += r'(?:[\s]+)?{0}(?:[\s]+)?'.format(r'(?:[\s]+)?'.join(parts))
-    return r'(?m)^{0}$'.format(regex)
+    return regex
+
+
+@bounded_memoize(WS_REGEX_CACHE_SIZE)
+def compile_whitespace_split_regex(text):
+    '''
+    Return the compiled regular expression built by
+    ``build_whitespace_split_regex`` for ``text``. Compiled expressions are
+    cached by text.
+    '''
+    return re.compile(build_whitespace_split_regex(text))
+
+
+def search_whitespace_split_blocks(content, blocks):
+    '''
+    Check which of ``blocks`` are found in ``content``, ignoring white space
+    the way ``build_whitespace_split_regex`` does. Returns a dict mapping
+    each block to True or False.
+
+    All blocks are searched for in a single pass over ``content``. A block
+    whose only occurrence overlaps the match of another one is caught by
+    searching for it again on its own.
+    '''
+    blocks = list(blocks)
+    ret = dict((block, False) for block in blocks)
+    if not blocks:
+        return ret
+    combined = re.compile(r'(?m){0}'.format(r'|'.join(
+        r'^(?P<b{0}>{1})$'.format(idx, _whitespace_split_body(block))
+        for idx, block in enumerate(blocks)
+    )))
+    found = False
+    for match in combined.finditer(content):
+        found = True
+        ret[blocks[int(match.lastgroup[1:])]] = True
+        if all(six.itervalues(ret)):
+            return ret
+    if found:
+        for block, value in six.iteritems(ret):
+            if not value:
+                ret[block] = compile_whitespace_split_regex(block) \
+                    .search(content) is not None
+    return ret
 
 
 def expr_match(line, expr):
@@ -322,6 +597,94 @@ def expr_match(line, expr):
     return False
 
 
+class Matcher(object):
+    '''
+    Precompiled version of ``expr_match`` for a list of expressions.
+
+    Plain strings are looked up in a set, and all globs and regular
+    expressions are compiled together into a single alternation so each
+    value is checked in one pass:
+
+    .. code-block:: python
+
+        >>> matcher = Matcher(['web*', 'db[0-9]+', 'mail.example.com'])
+        >>> matcher.match('db12')
+        True
+        >>> matcher.filter(['web1', 'cache1', 'mail.example.com'])
+        ['web1', 'mail.example.com']
+    '''
+
+    def __init__(self, exprs):
+        self.exprs = tuple(exprs)
+        self.literals = set()
+        self.regexes = []
+        patterns = []
+        for expr in self.exprs:
+            if not isinstance(expr, six.string_types):
+                log.error('Expression %r is not a string', expr)
+                continue
+            if not _EXPR_SPECIAL_CHARS.intersection(expr):
+                self.literals.add(os.path.normcase(expr))
+                continue
+            # fnmatch.fnmatch() normalizes the case of both arguments
+            patterns.append(fnmatch.translate(os.path.normcase(expr)))
+            try:
+                # Same validation as expr_match(), wrapping the expression
+                # could let invalid ones such as 'a)|(.*' compile
+                re.compile(r'\A{0}\Z'.format(expr))
+                pattern = r'(?:{0}\Z)'.format(expr)
+                regex = re.compile(pattern)
+            except re.error:
+                continue
+            if _EXPR_STANDALONE_RE.search(expr):
+                self.regexes.append(regex)
+            else:
+                patterns.append(pattern)
+        if patterns:
+            try:
+                self.regexes.insert(0, re.compile(
+                    '|'.join('(?:{0})'.format(x) for x in patterns)
+                ))
+            except re.error:
+                # Some expression doesn't combine with the others, e.g.
+                # because of inline flags. Compile them one by one.
+                self.regexes[:0] = [re.compile(x) for x in patterns]
+
+    @classmethod
+    def compile(cls, exprs):
+        '''
+        Return a cached matcher for ``exprs``, compiling it if needed
+        '''
+        return _compile_matcher(cls, tuple(exprs))
+
+    def match(self, value):
+        '''
+        Return True if ``value`` matches any of the expressions
+        '''
+        try:
+            if os.path.normcase(value) in self.literals:
+                return True
+            for regex in self.regexes:
+                if regex.match(value) is not None:
+                    return True
+        except TypeError:
+            log.exception('Value %r is not a string', value)
+        return False
+
+    __contains__ = match
+
+    def filter(self, values):
+        '''
+        Return the items of ``values`` which match any of the expressions
+        '''
+        return [value for value in values if self.match(value)]
+
+
+@bounded_memoize(MATCHER_CACHE_SIZE)
+def _compile_matcher(cls, exprs):
+    return cls(exprs)
+
+
 @jinja_filter('check_whitelist_blacklist')
 def check_whitelist_blacklist(value, whitelist=None, blacklist=None):
     '''
@@ -369,14 +732,139 @@ def check_whitelist_blacklist(value, whitelist=None, blacklist=None):
     else: 
         whitelist = []
 
-    _blacklist_match = any(expr_match(value, expr) for expr in blacklist)
-    _whitelist_match = any(expr_match(value, expr) for expr in whitelist)
+    if blacklist and Matcher.compile(blacklist).match(value):
+        return False
+    if whitelist:
+        return Matcher.compile(whitelist).match(value)
+    return True
 
-    if blacklist and not whitelist:
-        return not _blacklist_match
-    elif whitelist and not blacklist:
-        return _whitelist_match
-    elif blacklist and whitelist:
-        return not _blacklist_match and _whitelist_match
-    else:
-        return True
\ No newline at end of file
+
+class AhoCorasick(object):
+    '''
+    Aho-Corasick automaton to search text for many literal strings at once.
+
+    The automaton is built once from the patterns and then searches any
+    number of texts in a single pass each, whatever the number of patterns.
+    Patterns must be either all unicode or all bytes. Byte patterns can be
+    searched for in bytes, bytearrays and ``mmap`` objects.
+
+    .. code-block:: python
+
+        >>> automaton = AhoCorasick.compile(['he', 'she', 'hers'])
+        >>> automaton.contains_any('ushers')
+        True
+        >>> list(automaton.finditer('ushers'))
+        [(1, 'she'), (2, 'he'), (2, 'hers')]
+    '''
+
+    def __init__(self, patterns):
+        self.patterns = tuple(patterns)
+        kinds = set(isinstance(x, six.binary_type) for x in self.patterns)
+        if len(kinds) > 1:
+            raise TypeError('Patterns must be all unicode or all bytes')
+        self.binary = kinds == set([True])
+        self.match_empty = any(not x for x in self.patterns)
+
+        # One transition dict, failure link and output tuple per node, the
+        # root being node 0
+        goto = [{}]
+        outputs = [[]]
+        for pattern in self.patterns:
+            if not pattern:
+                continue
+            node = 0
+            for char in self._symbols(pattern):
+                nxt = goto[node].get(char)
+                if nxt is None:
+                    nxt = goto[node][char] = len(goto)
+                    goto.append({})
+                    outputs.append([])
+                node = nxt
+            if pattern not in outputs[node]:
+                outputs[node].append(pattern)
+
+        # Breadth first computation of the failure links, appending the
+        # outputs of the failure node to each node's own. Children of the
+        # root always fail back to the root.
+        fail = [0] * len(goto)
+        queue = list(six.itervalues(goto[0]))
+        for node in queue:
+            for char, child in six.iteritems(goto[node]):
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                outputs[child].extend(outputs[fail[child]])
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = [tuple(x) for x in outputs]
+
+    @staticmethod
+    def _symbols(text):
+        '''
+        Return something to iterate over the symbols of ``text``
+        '''
+        if isinstance(text, mmap.mmap):
+            return memoryview(text)
+        return text
+
+    @classmethod
+    def compile(cls, patterns):
+        '''
+        Return a cached automaton for the set of ``patterns``, building it if
+        needed
+        '''
+        return _compile_aho_corasick(cls, frozenset(patterns))
+
+    def _check_type(self, text):
+        binary = not isinstance(text, six.text_type)
+        if binary != self.binary and self.patterns:
+            raise TypeError(
+                'Cannot search {0} with {1} patterns'.format(
+                    type(text).__name__, 'bytes' if self.binary else 'unicode'
+                )
+            )
+
+    def finditer(self, text):
+        '''
+        Yield a ``(start, pattern)`` tuple for every occurrence of any of the
+        patterns in ``text``, overlapping ones included, ordered by the end
+        position of the match
+        '''
+        self._check_type(text)
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        node = 0
+        for pos, char in enumerate(self._symbols(text)):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for pattern in outputs[node]:
+                yield pos - len(pattern) + 1, pattern
+
+    def contains_any(self, text):
+        '''
+        Return True as soon as any of the patterns is found in ``text``
+        '''
+        if self.match_empty:
+            return True
+        for _ in self.finditer(text):
+            return True
+        return False
+
+    def matches(self, text):
+        '''
+        Return the set of patterns found in ``text``
+        '''
+        ret = set(pattern for _, pattern in self.finditer(text))
+        if self.match_empty:
+            ret.update(x for x in self.patterns if not x)
+        return ret
+
+
+@bounded_memoize(AHO_CORASICK_CACHE_SIZE)
+def _compile_aho_corasick(cls, patterns):
+    return cls(patterns)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+'''
+Template rendering
+
+Compiled templates are kept in an in-memory LRU cache keyed by the hash of
+their source, and optionally in an on-disk jinja bytecode cache, so the same
+template can be rendered for many contexts without being compiled again.
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import collections
+import hashlib
+import logging
+import multiprocessing
+import threading
+
+# Import slacker libs
+import slacker.utils.stringutils
+from slacker.utils.decorators.jinja import get_environment
+
+log = logging.getLogger(__name__)
+
+# Number of compiled templates kept in memory by default
+TEMPLATE_CACHE_SIZE = 128
+
+# Number of contexts sent to a worker at once by render_batch()
+RENDER_BATCH_CHUNKSIZE = 64
+
+# Template compiled once in each render_batch() worker process
+_WORKER_TEMPLATE = None
+
+
+def template_hash(source):
+    '''
+    Return the hash identifying a template by its source
+    '''
+    return hashlib.sha256(slacker.utils.stringutils.to_bytes(source)).hexdigest()
+
+
+class TemplateRenderer(object):
+    '''
+    Render jinja templates given as strings, caching the compiled templates.
+
+    cache_size
+        Number of compiled templates kept in memory, the least recently
+        used ones are dropped first.
+
+    bytecode_dir
+        Directory where the compiled bytecode of templates is stored, so it
+        can be reused by other processes and later runs. Disabled if None.
+
+    Any other keyword argument is passed to the jinja environment.
+    '''
+    def __init__(self, cache_size=TEMPLATE_CACHE_SIZE, bytecode_dir=None,
+                 **kwargs):
+        import jinja2
+
+        self.cache_size = cache_size
+        self.bytecode_cache = None
+        if bytecode_dir is not None:
+            self.bytecode_cache = jinja2.FileSystemBytecodeCache(bytecode_dir)
+        self.environment = get_environment(**kwargs)
+        self._templates = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _compile(self, source, key):
+        '''
+        Compile ``source``, going through the bytecode cache if enabled
+        '''
+        env = self.environment
+        if self.bytecode_cache is None:
+            return env.from_string(source)
+        bucket = self.bytecode_cache.get_bucket(env, key, None, source)
+        code = bucket.code
+        if code is None:
+            log.debug('Compiling template %s', key)
+            code = env.compile(source, name=key)
+            bucket.code = code
+            self.bytecode_cache.set_bucket(bucket)
+        return env.template_class.from_code(env, code, env.make_globals(None))
+
+    def get_template(self, source):
+        '''
+        Return the compiled template for ``source``
+        '''
+        key = template_hash(source)
+        with self._lock:
+            template = self._templates.pop(key, None)
+            if template is not None:
+                self.hits += 1
+                self._templates[key] = template
+                return template
+            self.misses += 1
+        template = self._compile(source, key)
+        with self._lock:
+            self._templates[key] = template
+            while len(self._templates) > self.cache_size:
+                self._templates.popitem(last=False)
+        return template
+
+    def render(self, source, context=None, **kwargs):
+        '''
+        Render the template ``source`` with ``context`` and ``kwargs``
+        '''
+        context = dict(context or {}, **kwargs)
+        return self.get_template(source).render(context)
+
+    def render_many(self, source, contexts):
+        '''
+        Render the template ``source`` once for each of ``contexts``,
+        yielding the results in order. The template is compiled only once.
+        '''
+        template = self.get_template(source)
+        for context in contexts:
+            yield template.render(context)
+
+    def clear(self):
+        '''
+        Drop the compiled templates kept in memory
+        '''
+        with self._lock:
+            self._templates.clear()
+
+
+_RENDERER = None
+_RENDERER_LOCK = threading.Lock()
+
+
+def get_renderer():
+    '''
+    Return the process wide default renderer
+    '''
+    global _RENDERER  # pylint: disable=global-statement
+    with _RENDERER_LOCK:
+        if _RENDERER is None:
+            _RENDERER = TemplateRenderer()
+        return _RENDERER
+
+
+def render_jinja(source, context=None, **kwargs):
+    '''
+    Render the jinja template ``source`` using the default renderer
+    '''
+    return get_renderer().render(source, context, **kwargs)
+
+
+def _init_render_worker(source, bytecode_dir, kwargs):
+    '''
+    Compile the template once when a render_batch() worker starts
+    '''
+    global _WORKER_TEMPLATE  # pylint: disable=global-statement
+    renderer = TemplateRenderer(bytecode_dir=bytecode_dir, **kwargs)
+    _WORKER_TEMPLATE = renderer.get_template(source)
+
+
+def _render_worker(context):
+    return _WORKER_TEMPLATE.render(context)
+
+
+def render_batch(source, contexts, processes=None,
+                 chunksize=RENDER_BATCH_CHUNKSIZE, bytecode_dir=None,
+                 **kwargs):
+    '''
+    Render the jinja template ``source`` once for each of ``contexts`` using
+    a pool of ``processes`` worker processes (one per CPU by default), and
+    yield the results in the same order as ``contexts``.
+
+    Each worker compiles the template and loads its filters once, then
+    renders ``chunksize`` contexts at a time. Contexts must be picklable.
+    ``bytecode_dir`` lets the workers share the compiled bytecode.
+    '''
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes <= 1:
+        renderer = TemplateRenderer(bytecode_dir=bytecode_dir, **kwargs)
+        for result in renderer.render_many(source, contexts):
+            yield result
+        return
+
+    pool = multiprocessing.Pool(
+        processes,
+        initializer=_init_render_worker,
+        initargs=(source, bytecode_dir, kwargs),
+    )
+    try:
+        for result in pool.imap(_render_worker, contexts, chunksize):
+            yield result
+        pool.close()
+    except BaseException:
+        # Includes the generator being closed before it was exhausted
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
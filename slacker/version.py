@@ -5,15 +5,11 @@ Setup version of Slacker
 
 # Import python libs
 from __future__ import absolute_import, print_function, unicode_literals
+import os
 import re
 import sys
 import platform
-
-# linux_distribution deprecated in python 3.7
-try:
-    from platform import linux_distribution
-except ImportError:
-    from distro import linux_distribution
+import threading
 
 # Import 3rd-party libs
 from slacker.ext import six
@@ -43,110 +39,342 @@ def slacker_information():
     yield 'Slacker', __version__
 
 
+# Libraries listed in the versions report, as (name, distributions,
+# module, attribute). The version of the first installed distribution is
+# reported. Only C libraries, whose version is known to their binding alone,
+# are read by importing ``module``, and only if the binding is installed.
+DEPENDENCIES = [
+    ('Jinja2', ('Jinja2',), None, None),
+    ('M2Crypto', ('M2Crypto',), None, None),
+    ('msgpack-python', ('msgpack', 'msgpack-python'), None, None),
+    ('msgpack-pure', ('msgpack-pure',), None, None),
+    ('pycrypto', ('pycrypto',), None, None),
+    ('pycryptodome', ('pycryptodome', 'pycryptodomex'), None, None),
+    ('libnacl', ('libnacl',), None, None),
+    ('PyYAML', ('PyYAML',), None, None),
+    ('ioflo', ('ioflo',), None, None),
+    ('PyZMQ', ('pyzmq',), None, None),
+    ('RAET', ('raet',), None, None),
+    ('ZMQ', ('pyzmq',), 'zmq', 'zmq_version'),
+    ('Mako', ('Mako',), None, None),
+    ('Tornado', ('tornado',), None, None),
+    ('timelib', ('timelib',), None, None),
+    ('dateutil', ('python-dateutil',), None, None),
+    ('pygit2', ('pygit2',), None, None),
+    ('libgit2', ('pygit2',), 'pygit2', 'LIBGIT2_VERSION'),
+    ('smmap', ('smmap', 'smmap2'), None, None),
+    ('cffi', ('cffi',), None, None),
+    ('pycparser', ('pycparser',), None, None),
+    ('gitdb', ('gitdb', 'gitdb2'), None, None),
+    ('gitpython', ('GitPython',), None, None),
+    ('python-gnupg', ('python-gnupg',), None, None),
+    ('mysql-python', ('mysqlclient', 'MySQL-python'), None, None),
+    ('cherrypy', ('CherryPy',), None, None),
+    ('docker-py', ('docker', 'docker-py'), None, None),
+]
+
+_DIST_NAME_RE = re.compile(r'[-_.]+')
+_DIST_INFO_RE = re.compile(
+    r'^(?P<name>[^-]+)(?:-(?P<version>[^-]+))?(?:-py\d.*)?'
+    r'\.(?:dist-info|egg-info|egg)$',
+    re.IGNORECASE
+)
+
+# (sys.path entries with their mtime, installed distributions)
+_DISTRIBUTIONS = (None, None)
+
+
+def _normalize_dist_name(name):
+    return _DIST_NAME_RE.sub('-', name).lower()
+
+
+def _read_metadata_version(path):
+    '''
+    Return the ``Version`` header of the metadata of the distribution in
+    ``path``, a .dist-info or .egg-info directory or an .egg-info file
+    '''
+    if os.path.isdir(path):
+        for name in ('METADATA', 'PKG-INFO'):
+            if os.path.isfile(os.path.join(path, name)):
+                path = os.path.join(path, name)
+                break
+        else:
+            return None
+    try:
+        with open(path, 'rb') as fp_:
+            for line in fp_:
+                line = line.decode('utf-8', 'replace').strip()
+                if not line:
+                    # End of the headers
+                    break
+                if line.lower().startswith('version:'):
+                    return line.split(':', 1)[1].strip()
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def _scan_path_entry(entry, distributions):
+    '''
+    Record the distributions installed in the sys.path entry ``entry``
+    which are not in ``distributions`` yet
+    '''
+    try:
+        names = os.listdir(entry or '.')
+    except OSError:
+        names = []
+    if entry.lower().endswith('.egg'):
+        # The entry is an egg itself
+        names = [os.path.basename(entry)]
+        entry = os.path.dirname(entry)
+    for name in names:
+        match = _DIST_INFO_RE.match(name)
+        if match is None:
+            continue
+        key = _normalize_dist_name(match.group('name'))
+        if key not in distributions:
+            distributions[key] = (
+                match.group('version'), os.path.join(entry, name)
+            )
+
+
+def _environment_key():
+    '''
+    Return the sys.path entries with their modification time, which change
+    when a distribution is installed or removed
+    '''
+    key = []
+    for entry in sys.path:
+        try:
+            key.append((entry, os.stat(entry or '.').st_mtime))
+        except OSError:
+            key.append((entry, None))
+    return tuple(key)
+
+
+def installed_distributions():
+    '''
+    Return a dict mapping the normalized names of the distributions
+    installed in sys.path to ``(version, path)`` tuples, ``version`` being
+    None if it isn't in the name of the metadata directory.
+
+    Nothing is imported: the metadata directories are listed once and the
+    result is reused until a sys.path entry is modified.
+    '''
+    global _DISTRIBUTIONS  # pylint: disable=global-statement
+    key = _environment_key()
+    if _DISTRIBUTIONS[0] == key:
+        return _DISTRIBUTIONS[1]
+    distributions = {}
+    for entry, _ in key:
+        _scan_path_entry(entry, distributions)
+    _DISTRIBUTIONS = (key, distributions)
+    return distributions
+
+
+def distribution_version(*names):
+    '''
+    Return the version of the first installed distribution of ``names``,
+    or None if none of them is installed
+    '''
+    distributions = installed_distributions()
+    for name in names:
+        try:
+            version, path = distributions[_normalize_dist_name(name)]
+        except KeyError:
+            continue
+        if version is None:
+            version = _read_metadata_version(path)
+        return version or 'Unable to determine version'
+    return None
+
+
+def _import_version(module, attr):
+    try:
+        version = getattr(__import__(module), attr, None)
+        if callable(version):
+            version = version()
+    except Exception:  # pylint: disable=broad-except
+        return None
+    if version is None:
+        return 'Unable to determine version'
+    if isinstance(version, (tuple, list)):
+        version = '.'.join(map(str, version))
+    return version
+
+
 def dependency_information():
     '''
     Report versions of library dependencies.
     '''
-    libs = [
-        ('Python', None, sys.version.rsplit('\n')[0].strip()),
-        ('Jinja2', 'jinja2', '__version__'),
-        ('M2Crypto', 'M2Crypto', 'version'),
-        ('msgpack-python', 'msgpack', 'version'),
-        ('msgpack-pure', 'msgpack_pure', 'version'),
-        ('pycrypto', 'Crypto', '__version__'),
-        ('pycryptodome', 'Cryptodome', 'version_info'),
-        ('libnacl', 'libnacl', '__version__'),
-        ('PyYAML', 'yaml', '__version__'),
-        ('ioflo', 'ioflo', '__version__'),
-        ('PyZMQ', 'zmq', '__version__'),
-        ('RAET', 'raet', '__version__'),
-        ('ZMQ', 'zmq', 'zmq_version'),
-        ('Mako', 'mako', '__version__'),
-        ('Tornado', 'tornado', 'version'),
-        ('timelib', 'timelib', 'version'),
-        ('dateutil', 'dateutil', '__version__'),
-        ('pygit2', 'pygit2', '__version__'),
-        ('libgit2', 'pygit2', 'LIBGIT2_VERSION'),
-        ('smmap', 'smmap', '__version__'),
-        ('cffi', 'cffi', '__version__'),
-        ('pycparser', 'pycparser', '__version__'),
-        ('gitdb', 'gitdb', '__version__'),
-        ('gitpython', 'git', '__version__'),
-        ('python-gnupg', 'gnupg', '__version__'),
-        ('mysql-python', 'MySQLdb', '__version__'),
-        ('cherrypy', 'cherrypy', '__version__'),
-        ('docker-py', 'docker', '__version__'),
-    ]
-
-    for name, imp, attr in libs:
-        if imp is None:
-            yield name, attr
-            continue
+    yield 'Python', sys.version.rsplit('\n')[0].strip()
+    for name, dists, module, attr in DEPENDENCIES:
+        version = distribution_version(*dists)
+        if version is not None and module is not None:
+            version = _import_version(module, attr)
+        yield name, version
+
+
+# Files describing the operating system, the first one found is used
+OS_RELEASE_FILES = ('/etc/os-release', '/usr/lib/os-release')
+
+_OS_RELEASE_UNESCAPE_RE = re.compile(r'\\([\\$"`])')
+
+_SYSTEM_INFO = None
+_SYSTEM_INFO_LOCK = threading.Lock()
+
+
+def parse_os_release(path=None):
+    '''
+    Parse an os-release file, the first of ``OS_RELEASE_FILES`` found by
+    default, and return its variables as a dict. Returns an empty dict if
+    there is no such file.
+    '''
+    paths = OS_RELEASE_FILES if path is None else (path,)
+    for path in paths:
         try:
-            imp = __import__(imp)
-            version = getattr(imp, attr, None)
-            if version is None:
-                version = 'Unable to determine version'
-            if callable(version):
-                version = version()
-            if isinstance(version, (tuple, list)):
-                version = '.'.join(map(str, version))
-            yield name, version
-        except Exception:
-            yield name, None
+            with open(path, 'rb') as fp_:
+                data = fp_.read().decode('utf-8', 'replace')
+            break
+        except (IOError, OSError):
+            continue
+    else:
+        return {}
+    ret = {}
+    for line in data.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'':
+            quote, value = value[0], value[1:-1]
+            if quote == '"':
+                value = _OS_RELEASE_UNESCAPE_RE.sub(r'\1', value)
+        ret[key.strip()] = value
+    return ret
 
 
-def system_information():
+def linux_distribution(full_distribution_name=True, os_release=None):
     '''
-    Report system versions.
+    Return the ``(name, version, codename)`` of the Linux distribution, read
+    from ``os_release`` (see ``parse_os_release``). ``name`` is the short
+    ID of the distribution if ``full_distribution_name`` is False.
+    '''
+    if os_release is None:
+        os_release = parse_os_release()
+    if full_distribution_name:
+        name = os_release.get('NAME', '')
+    else:
+        name = os_release.get('ID', '')
+    codename = os_release.get('VERSION_CODENAME', '')
+    if not codename:
+        match = re.search(r'\(([^)]+)\)', os_release.get('VERSION', ''))
+        if match:
+            codename = match.group(1)
+    return name, os_release.get('VERSION_ID', ''), codename
+
+
+def _system_version(os_release):
     '''
-    def system_version():
-        '''
-        Return host system version.
-        '''
-        lin_ver = linux_distribution()
+    Return host system version.
+    '''
+    if sys.platform.startswith('darwin'):
         mac_ver = platform.mac_ver()
-        win_ver = platform.win32_ver()
-
-        if lin_ver[0]:
-            return ' '.join(lin_ver)
-        elif mac_ver[0]:
-            if isinstance(mac_ver[1], (tuple, list)) and ''.join(mac_ver[1]):
-                return ' '.join([mac_ver[0], '.'.join(mac_ver[1]), mac_ver[2]])
-            else:
-                return ' '.join([mac_ver[0], mac_ver[2]])
-        elif win_ver[0]:
-            return ' '.join(win_ver)
-        else:
-            return ''
+        if isinstance(mac_ver[1], (tuple, list)) and ''.join(mac_ver[1]):
+            return ' '.join([mac_ver[0], '.'.join(mac_ver[1]), mac_ver[2]])
+        return ' '.join([mac_ver[0], mac_ver[2]])
+    if sys.platform.startswith('win'):
+        release, ver, sp, extra = platform.win32_ver()
+        return ' '.join([release, ver, sp, extra])
+    lin_ver = linux_distribution(os_release=os_release)
+    if lin_ver[0]:
+        return ' '.join(lin_ver)
+    return ''
 
-    version = system_version()
-    release = platform.release()
-    if platform.win32_ver()[0]:
+
+def _collect_system_info():
+    os_release = {} if sys.platform.startswith(('darwin', 'win')) \
+        else parse_os_release()
+    version = _system_version(os_release)
+    uname = platform.uname()
+    release = uname[2]
+    if sys.platform.startswith('win'):
         import win32api
         server = {'Vista': '2008Server',
                   '7': '200ServerR2',
                   '8': '2012Server',
                   '8.1': '2012ServerR2',
                   '10': '2016Server'}
-        
-        if win32api.GetVerionEx(1)[8] > 1 and release in server:
+
+        if win32api.GetVersionEx(1)[8] > 1 and release in server:
             release = server[release]
         _, ver, sp, extra = platform.win32_ver()
         version = ' '.join([release, ver, sp, extra])
 
-    system = [
-        ('system', platform.system()),
-        ('dist', ' '.join(linux_distribution(full_distribution_name=False))),
-        ('release', release),
-        ('machine', platform.machine()),
-        ('version', version),
-    ]
+    return {
+        'system': uname[0],
+        'dist': ' '.join(linux_distribution(False, os_release)).strip(),
+        'release': release,
+        'machine': uname[4],
+        'version': version,
+        'os_release': os_release,
+    }
 
-    for name, attr in system:
-        yield name, attr
-        continue
+
+def system_info(refresh=False):
+    '''
+    Return the system versions as a dict with the ``system``, ``dist``,
+    ``release``, ``machine`` and ``version`` keys, plus the parsed
+    os-release file under ``os_release``.
+
+    They are collected on the first call and kept for the life of the
+    process, pass ``refresh=True`` to collect them again.
+    '''
+    global _SYSTEM_INFO  # pylint: disable=global-statement
+    with _SYSTEM_INFO_LOCK:
+        if _SYSTEM_INFO is None or refresh:
+            _SYSTEM_INFO = _collect_system_info()
+        info = _SYSTEM_INFO
+    ret = dict(info)
+    ret['os_release'] = dict(info['os_release'])
+    return ret
+
+
+def system_information():
+    '''
+    Report system versions.
+    '''
+    info = system_info()
+    for name in ('system', 'dist', 'release', 'machine', 'version'):
+        yield name, info[name]
 
 
 def version_report():
-    return 'Slacker v{0}'.format(__version__)
\ No newline at end of file
+    return 'Slacker v{0}'.format(__version__)
+
+
+def versions_information():
+    '''
+    Report the versions of slacker, its dependencies and the system
+    '''
+    return {
+        'Slacker Version': dict(slacker_information()),
+        'Dependency Versions': dict(dependency_information()),
+        'System Versions': dict(system_information()),
+    }
+
+
+def versions_report():
+    '''
+    Yield the lines of the versions report
+    '''
+    ver_info = versions_information()
+    padding = max(len(name) for info in ver_info.values() for name in info)
+    fmt = '{0:>{pad}}: {1}'
+    for ver_type in ('Slacker Version', 'Dependency Versions',
+                     'System Versions'):
+        yield '{0}:'.format(ver_type)
+        for name in sorted(ver_info[ver_type], key=lambda x: x.lower()):
+            yield fmt.format(name, ver_info[ver_type][name] or 'Not Installed',
+                             pad=padding)
+        yield ' '
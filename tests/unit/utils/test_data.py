@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for slacker.utils.data
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+
+# Import 3rd-party libs
+import pytest
+
+# Import slacker libs
+from slacker.utils.data import FrozenDict, FrozenList, freeze, thaw
+
+
+@pytest.mark.parametrize('data', [
+    {'a': [1, {'b': 2}], 'c': {'d': None}},
+    [1, 'two', [3.0, [4]]],
+    {'s': {1, 2, 3}},
+    'scalar',
+])
+def test_freeze_thaw_round_trip(data):
+    frozen = freeze(data)
+    assert thaw(frozen) == data
+    assert freeze(thaw(frozen)) is frozen
+
+
+def test_freeze_thaw_tuple_keys_and_members():
+    assert thaw(freeze({(1, 2): 'a'})) == {(1, 2): 'a'}
+    assert thaw(freeze({'s': {(1, 2)}})) == {'s': {(1, 2)}}
+    assert thaw(freeze({((1, 2), 3): [4]})) == {((1, 2), 3): [4]}
+
+
+def test_freeze_is_immutable():
+    frozen = freeze({'a': [1]})
+    assert isinstance(frozen, FrozenDict)
+    assert isinstance(frozen['a'], FrozenList)
+    with pytest.raises(TypeError):
+        frozen['a'] = 2
+
+
+def test_freeze_interns_equal_values():
+    assert freeze({'a': [1, 2]}) is freeze({'a': [1, 2]})
+    assert freeze([1, 2]) is freeze((1, 2))
+
+
+def test_freeze_interning_keeps_types():
+    # 1 == 1.0 == True but they must not be merged into one frozen value
+    for values in ([1], [1.0], [True]):
+        frozen = freeze(values)
+        assert type(frozen[0]) is type(values[0])
+        assert type(thaw(frozen)[0]) is type(values[0])
+    assert type(freeze({'a': 1})['a']) is int
+    assert type(freeze({'a': True})['a']) is bool
+    assert type(next(iter(freeze([{1}])[0]))) is int
+    assert type(next(iter(freeze([{True}])[0]))) is bool
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for slacker.utils.decorators
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import os
+import threading
+import time
+
+# Import 3rd-party libs
+import pytest
+
+# Import slacker libs
+from slacker.utils import decorators
+from slacker.utils.decorators.jinja import LazyMap
+
+
+def test_memoize_caches_by_arguments():
+    calls = []
+
+    @decorators.memoize
+    def func(arg, kwarg=None):
+        calls.append((arg, kwarg))
+        return arg
+
+    assert func(1) == func(1) == 1
+    assert func(1, kwarg=2) == 1
+    assert calls == [(1, None), (1, 2)]
+    assert func.cache_info() == decorators.CacheInfo(1, 2, None, 2)
+    # Unhashable arguments aren't cached
+    assert func([1]) == func([1]) == [1]
+    assert len(calls) == 4
+
+
+def test_memoize_collapses_concurrent_calls():
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    @decorators.memoize
+    def func(arg):
+        calls.append(arg)
+        started.set()
+        release.wait(5)
+        return arg * 2
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(func(21)))
+        for _ in range(5)
+    ]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # Give the other threads time to wait for the first one
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == [42] * 5
+    assert calls == [21]
+
+
+def test_memoize_does_not_cache_exceptions():
+    calls = []
+
+    @decorators.memoize
+    def func():
+        calls.append(None)
+        raise ValueError('boom')
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            func()
+    assert len(calls) == 2
+
+
+def test_lru_memoize():
+    calls = []
+
+    @decorators.lru_memoize(maxsize=2)
+    def func(arg):
+        calls.append(arg)
+        return arg
+
+    func(1)
+    func(2)
+    func(1)
+    func(3)
+    assert func.cache_info().currsize == 2
+    func(1)
+    func(2)
+    assert calls == [1, 2, 3, 2]
+
+
+def test_ttl_memoize(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(decorators, '_monotonic', lambda: now[0])
+    calls = []
+
+    @decorators.ttl_memoize(10)
+    def func(arg):
+        calls.append(arg)
+        return arg
+
+    func(1)
+    now[0] += 5
+    func(1)
+    assert calls == [1]
+    now[0] += 10
+    func(1)
+    assert calls == [1, 1]
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='Needs os.fork()')
+def test_memoize_reset_after_fork():
+    @decorators.memoize
+    def func(arg):
+        return arg
+
+    func(1)
+    assert func.cache_info().currsize == 1
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            func(1)
+            info = func.cache_info()
+            os.write(write_fd, '{0} {1}'.format(info.misses,
+                                                info.currsize).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    assert os.read(read_fd, 100) == b'1 1'
+    os.close(read_fd)
+    assert func.cache_info().misses == 1
+
+
+def test_memoize_coroutine():
+    asyncio = pytest.importorskip('asyncio')
+    calls = []
+
+    @decorators.memoize
+    async def func(arg):
+        calls.append(arg)
+        await asyncio.sleep(0.01)
+        return arg * 2
+
+    async def main():
+        return await asyncio.gather(*[func(21) for _ in range(5)])
+
+    assert func.is_coroutine
+    assert asyncio.run(main()) == [42] * 5
+    # Cached results are returned in other event loops too
+    assert asyncio.run(main()) == [42] * 5
+    assert calls == [21]
+    assert func.cache_info().misses == 1
+
+
+def test_memoize_coroutine_cancelled_caller():
+    asyncio = pytest.importorskip('asyncio')
+
+    @decorators.memoize
+    async def func():
+        await asyncio.sleep(0.05)
+        return 'done'
+
+    async def main():
+        first = asyncio.ensure_future(func())
+        second = asyncio.ensure_future(func())
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == 'done'
+
+
+def _lazy_map(resolved):
+    def resolve(module, attribute):
+        if module == 'missing':
+            raise ImportError(module)
+        resolved.append(attribute)
+        return attribute.upper()
+    return LazyMap({'eager': 1}, {'lazy': ('mod', 'lazy'),
+                                  'broken': ('missing', 'broken')}, resolve)
+
+
+def test_lazy_map_copy_stays_lazy():
+    resolved = []
+    mapping = _lazy_map(resolved)
+    copied = mapping.copy()
+    assert resolved == []
+    assert isinstance(copied, LazyMap)
+    assert sorted(copied.keys()) == ['broken', 'eager', 'lazy']
+    assert copied['lazy'] == 'LAZY'
+    assert 'lazy' not in dict.keys(mapping)
+
+
+def test_lazy_map_items_and_values():
+    mapping = _lazy_map([])
+    assert sorted(mapping.items(), key=lambda item: item[0]) == \
+        [('eager', 1), ('lazy', 'LAZY')]
+    assert sorted(mapping.values(), key=str) == [1, 'LAZY']
+    with pytest.raises(KeyError):
+        mapping['broken']
+
+
+def test_bounded_memoize():
+    calls = []
+
+    @decorators.bounded_memoize(2)
+    def func(*args):
+        calls.append(args)
+        return len(calls)
+
+    assert func(1) == func(1) == 1
+    func(2)
+    # Full, the cache is emptied before storing the next result
+    func(3)
+    assert func(1) == 4
+    assert func(3) == 3
+    assert func([1]) == 5
+    assert func([1]) == 6
+    func.cache_clear()
+    assert func(3) == 7
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for slacker.utils.dictupdate
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import copy
+
+# Import 3rd-party libs
+import pytest
+
+# Import slacker libs
+from slacker.utils import dictupdate
+
+BASE = {
+    'a': {'b': [1, 2], 'c': {'d': 1}},
+    'e': [{'f': 1}],
+    'g': 'h',
+}
+UPDATE = {
+    'a': {'b': [2, 3], 'c': {'i': 2}},
+    'e': [{'f': 1}, {'f': 2}],
+    'j': {'k': 1},
+}
+
+
+@pytest.mark.parametrize('strategy,expected', [
+    ('overwrite', {
+        'a': {'b': [2, 3], 'c': {'i': 2}},
+        'e': [{'f': 1}, {'f': 2}],
+        'g': 'h',
+        'j': {'k': 1},
+    }),
+    ('recurse', {
+        'a': {'b': [2, 3], 'c': {'d': 1, 'i': 2}},
+        'e': [{'f': 1}, {'f': 2}],
+        'g': 'h',
+        'j': {'k': 1},
+    }),
+    ('aggregate', {
+        'a': {'b': [1, 2, 3], 'c': {'d': 1, 'i': 2}},
+        'e': [{'f': 1}, {'f': 2}],
+        'g': 'h',
+        'j': {'k': 1},
+    }),
+    ('list-append', {
+        'a': {'b': [1, 2, 2, 3], 'c': {'d': 1, 'i': 2}},
+        'e': [{'f': 1}, {'f': 1}, {'f': 2}],
+        'g': 'h',
+        'j': {'k': 1},
+    }),
+])
+def test_merge_strategies(strategy, expected):
+    obj_a = copy.deepcopy(BASE)
+    obj_b = copy.deepcopy(UPDATE)
+    assert dictupdate.merge(obj_a, obj_b, strategy) == expected
+    # Neither input is modified
+    assert obj_a == BASE
+    assert obj_b == UPDATE
+
+
+def test_merge_recurse_merge_lists():
+    assert dictupdate.merge({'a': [1]}, {'a': [1, 2]}, merge_lists=True) == \
+        {'a': [1, 1, 2]}
+
+
+def test_merge_unknown_strategy_recurses():
+    assert dictupdate.merge({'a': {'b': 1}}, {'a': {'c': 2}}, 'bogus') == \
+        {'a': {'b': 1, 'c': 2}}
+
+
+def test_merge_aggregate_unhashable_items():
+    assert dictupdate.merge(
+        {'a': [1]}, {'a': [{'x': 1}, {'x': 1}, 1, 2]}, 'aggregate'
+    ) == {'a': [1, {'x': 1}, 2]}
+    assert dictupdate.merge(
+        {'a': [{'x': 1}, 1]}, {'a': [{'x': 1}, 1, 3, 3]}, 'aggregate'
+    ) == {'a': [{'x': 1}, 1, 3]}
+
+
+def test_merge_all():
+    layers = [{'a': {'b': 1}}, {'a': {'c': 2}}, {'a': {'b': 3}, 'd': 4}]
+    before = copy.deepcopy(layers)
+    assert dictupdate.merge_all(layers) == {'a': {'b': 3, 'c': 2}, 'd': 4}
+    assert layers == before
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for slacker.utils.odict
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+from collections import OrderedDict
+
+# Import 3rd-party libs
+import pytest
+
+# Import slacker libs
+from slacker.utils.odict import CompactOrderedDict
+
+
+def test_popitem():
+    mapping = CompactOrderedDict((key, key * 2) for key in range(5))
+    assert mapping.popitem() == (4, 8)
+    assert mapping.popitem(last=False) == (0, 0)
+    del mapping[1]
+    assert mapping.popitem(last=False) == (2, 4)
+    assert mapping.popitem() == (3, 6)
+    with pytest.raises(KeyError):
+        mapping.popitem()
+
+
+def test_popitem_drains_in_order():
+    expected = OrderedDict((key, None) for key in range(1000))
+    mapping = CompactOrderedDict(expected)
+    for idx in range(1000):
+        last = idx % 3 == 0
+        assert mapping.popitem(last) == expected.popitem(last)
+        assert list(mapping) == list(expected)
+
+
+def test_move_to_end():
+    mapping = CompactOrderedDict((key, None) for key in 'abcd')
+    mapping.move_to_end('a')
+    assert list(mapping) == ['b', 'c', 'd', 'a']
+    assert mapping.key_at(0) == 'b'
+    assert mapping.item_at(-1) == ('a', None)
+    mapping.move_to_end('d', last=False)
+    assert list(mapping) == ['d', 'b', 'c', 'a']
+    assert mapping.key_at(2) == 'c'
+    with pytest.raises(KeyError):
+        mapping.move_to_end('x')
+
+
+def test_slice():
+    mapping = CompactOrderedDict((key, str(key)) for key in range(6))
+    del mapping[2]
+    sliced = mapping.slice(1, 4)
+    assert list(sliced.items()) == [(1, '1'), (3, '3'), (4, '4')]
+    assert mapping.slice(step=2) == OrderedDict([(0, '0'), (3, '3'), (5, '5')])
+    sliced[1] = 'one'
+    assert mapping[1] == '1'
+
+
+def test_copy_after_modification():
+    mapping = CompactOrderedDict((key, 0) for key in 'abc')
+    snapshot = mapping.copy()
+    mapping['a'] = 1
+    del mapping['b']
+    mapping['d'] = 2
+    mapping.popitem(last=False)
+    assert list(snapshot.items()) == [('a', 0), ('b', 0), ('c', 0)]
+    assert list(mapping.items()) == [('c', 0), ('d', 2)]
+    snapshot.move_to_end('a')
+    assert list(snapshot) == ['b', 'c', 'a']
+    assert list(mapping) == ['c', 'd']
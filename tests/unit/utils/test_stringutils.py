@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+'''
+Tests for slacker.utils.stringutils
+'''
+
+# Import python libs
+from __future__ import absolute_import, print_function, unicode_literals
+import random
+
+# Import 3rd-party libs
+import pytest
+
+# Import slacker libs
+import slacker.utils.stringutils as stringutils
+
+
+def test_check_whitelist_blacklist_invalid_regex():
+    assert not stringutils.check_whitelist_blacklist(
+        'evil-minion', whitelist=['web)|(.*']
+    )
+    assert stringutils.check_whitelist_blacklist(
+        'evil-minion', blacklist=['web)|(.*']
+    )
+
+
+@pytest.mark.filterwarnings('ignore::FutureWarning')
+def test_matcher_agrees_with_expr_match():
+    rand = random.Random(0)
+    tokens = list('ab1.*?|()[]^$\\+') + ['\\1', '(?(1)', '(?(2)', '{1}']
+    for _ in range(5000):
+        exprs = [
+            ''.join(rand.choice(tokens) for _ in range(rand.randint(1, 6)))
+            for _ in range(rand.randint(1, 3))
+        ]
+        value = ''.join(rand.choice('ab1.') for _ in range(rand.randint(0, 4)))
+        expected = any(stringutils.expr_match(value, expr) for expr in exprs)
+        assert stringutils.Matcher(exprs).match(value) == expected, \
+            (exprs, value)
+
+
+def test_matcher_group_references():
+    # Group numbers shift once merged into an alternation
+    assert stringutils.Matcher(['(a)b', '(x)?(?(1)y|z)']).match('xy')
+    assert stringutils.Matcher(['(a)b', '(x)?(?(1)y|z)']).match('z')
+    assert not stringutils.Matcher(['(a)b', '(x)?(?(1)y|z)']).match('y')
+    assert stringutils.Matcher(['(a)b', '(c)\\1']).match('cc')
+    assert stringutils.Matcher(['(a)b', '(?P<c>c)(?P=c)']).match('cc')